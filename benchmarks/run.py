@@ -0,0 +1,215 @@
+"""Benchmarks of opening, listing and extracting synthetic archives over a local server.
+
+    python -m benchmarks.run [--http 2] [--latency 0.02] [--bandwidth 50M] [--save baseline.json]
+    python -m benchmarks.run --baseline baseline.json
+
+Every scenario runs in a process of its own, so that its peak RSS is its own. With a
+baseline, results are compared against it, and the exit status tells of any regression.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+import urllib.request
+
+from tabulate import tabulate
+
+from .synth import make_archive
+
+# name -> parameters of the archive, and the operations benchmarked on it.
+SCENARIOS = {
+    'tiny': (dict(count=10, size=4096), ('open', 'list', 'extract')),
+    'small': (dict(count=1000, size=16 * 1024), ('open', 'list', 'extract')),
+    'methods': (dict(count=200, size=256 * 1024), ('open', 'extract')),
+    'large': (dict(count=4, size=16 * 1024 * 1024, methods=('stored', 'deflate')), ('open', 'extract')),
+    'zip64': (dict(count=1000, size=4096, zip64=True), ('open', 'list', 'extract')),
+    'many': (dict(count=100_000, size=64, methods=('stored', 'deflate')), ('open', 'list')),
+    'huge': (dict(count=1_000_000, size=16, methods=('stored', 'deflate')), ('open', 'list')),
+}
+DEFAULT_SCENARIOS = ('tiny', 'small', 'methods', 'large', 'zip64', 'many')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Slowdowns beyond this fraction of the baseline are regressions...
+DEFAULT_THRESHOLD = 0.25
+# ...if they're of at least this many seconds too; operations of a few milliseconds easily
+# take twice as long by chance.
+DEFAULT_MIN_DELTA = 0.05
+
+
+def _server_stats(url, reset=False):
+    with urllib.request.urlopen(url + '/_stats' + ('?reset' if reset else '')) as r:
+        return json.load(r)
+
+
+async def _bench(url, server, operations, http):
+    import httpx
+
+    from zipinspect import extract_entries
+    from zipinspect.zipread import HTTPZipReader
+
+    results = {}
+
+    _server_stats(server, reset=True)
+    started = time.perf_counter()
+    # NOTE HTTP/2 over cleartext needs prior knowledge, that is, no HTTP/1.1 at all.
+    async with httpx.AsyncClient(http1=http == 1, http2=http == 2) as client, \
+            HTTPZipReader(url, client=client) as z:
+        results['open'] = {'seconds': time.perf_counter() - started,
+                           'requests': _server_stats(server)['requests']}
+
+        if 'list' in operations:
+            started = time.perf_counter()
+            for _ in z.entries:
+                pass
+            await z.path_index()
+            results['list'] = {'seconds': time.perf_counter() - started}
+
+        if 'extract' in operations:
+            entries = [info for info in z.entries if not info.is_dir]
+            size = sum(info.file_size for info in entries)
+            compressed_size = sum(info.compressed_size for info in entries)
+
+            with tempfile.TemporaryDirectory() as out_dir:
+                # NOTE Outputs are only written under the working directory.
+                os.chdir(out_dir)
+
+                _server_stats(server, reset=True)
+                started = time.perf_counter()
+                await extract_entries(z, entries, out_dir='out')
+                seconds = time.perf_counter() - started
+                stats = _server_stats(server)
+
+            results['extract'] = {'seconds': seconds, 'requests': stats['requests'],
+                                  'mb_per_s': size / seconds / 1e6,
+                                  'wire_mb_per_s': stats['bytes'] / seconds / 1e6,
+                                  'overfetch': stats['bytes'] / compressed_size if compressed_size else None}
+
+    results['peak_rss_mb'] = _peak_rss_mb()
+    return results
+
+
+def _peak_rss_mb():
+    """Peak RSS of this process, since it was exec'd."""
+    # NOTE ru_maxrss is carried over through fork and exec on Linux, so it would tell that of
+    # the parent, which grows large generating archives; VmHWM is of this image only.
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    # Kilobytes on Linux, bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+def run_scenario(name, archive, server, args):
+    """Run a scenario in a process of its own; returns its results."""
+    _, operations = SCENARIOS[name]
+    url = f'{server}/{os.path.basename(archive)}'
+
+    child = subprocess.run([sys.executable, '-m', 'benchmarks.run', '--child', url, server,
+                            ','.join(operations), str(args.http)],
+                           cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    return json.loads(child.stdout)
+
+
+def compare(results, baseline, threshold, min_delta=DEFAULT_MIN_DELTA):
+    """Rows comparing results with a baseline, and whether anything regressed."""
+    rows = []
+    regressed = False
+
+    for name, result in results.items():
+        for operation, metrics in result.items():
+            if not isinstance(metrics, dict):
+                continue
+
+            before = baseline.get(name, {}).get(operation, {})
+            change = None
+            if before.get('seconds'):
+                change = metrics['seconds'] / before['seconds'] - 1
+                regressed |= change > threshold and metrics['seconds'] - before['seconds'] >= min_delta
+            # NOTE More requests are a regression regardless of timing noise.
+            if before.get('requests') is not None:
+                regressed |= metrics.get('requests', 0) > before['requests']
+
+            rows.append((name, operation, f"{metrics['seconds']:.3f}",
+                         metrics.get('requests', ''),
+                         f"{metrics['mb_per_s']:.1f}" if 'mb_per_s' in metrics else '',
+                         f"{result['peak_rss_mb']:.0f}",
+                         f"{change:+.0%}" if change is not None else ''))
+
+    return rows, regressed
+
+
+def main():
+    if sys.argv[1:2] == ['--child']:
+        url, server, operations, http = sys.argv[2:6]
+        print(json.dumps(asyncio.run(_bench(url, server, operations.split(','), int(http)))))
+        return
+
+    parser = argparse.ArgumentParser(description="Benchmark zipinspect against a local range server")
+    parser.add_argument('scenarios', nargs='*', default=DEFAULT_SCENARIOS,
+                        help=f"any of {', '.join(SCENARIOS)}")
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'zipinspect-bench'),
+                        help="where generated archives are kept")
+    parser.add_argument('--http', type=int, choices=(1, 2), default=2)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--bandwidth', help="cap per connection, e.g. 50M for 50 MiB/s")
+    parser.add_argument('--baseline', help="results to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--min-delta', type=float, default=DEFAULT_MIN_DELTA,
+                        help="seconds a slowdown has to amount to, to be a regression")
+    parser.add_argument('--save', help="save the results, as a baseline")
+    args = parser.parse_args()
+
+    archives = {}
+    for name in args.scenarios:
+        params, _ = SCENARIOS[name]
+        print(f"Generating archive for {name}...", file=sys.stderr)
+        archives[name] = make_archive(args.work_dir, **params)
+
+    # The server runs in a process of its own, so that it doesn't compete with the client.
+    server_process = subprocess.Popen([sys.executable, '-m', 'benchmarks.server', args.work_dir,
+                                       '--port', '0', '--latency', str(args.latency)]
+                                      + (['--bandwidth', args.bandwidth] if args.bandwidth else []),
+                                      cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    try:
+        server = server_process.stdout.readline().split()[-1].rstrip('/')
+
+        results = {}
+        for name in args.scenarios:
+            print(f"Running {name}...", file=sys.stderr)
+            results[name] = run_scenario(name, archives[name], server, args)
+    finally:
+        server_process.terminate()
+        server_process.wait()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    rows, regressed = compare(results, baseline, args.threshold, args.min_delta)
+    print(tabulate(rows, headers=['scenario', 'operation', 'seconds', 'requests', 'MB/s',
+                                  'peak RSS (MB)', 'vs. baseline']))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if regressed:
+        print("Regressed against the baseline", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
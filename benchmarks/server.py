@@ -0,0 +1,296 @@
+"""Local stand-in for a range-serving HTTP server, for benchmarks. It speaks HTTP/1.1 and
+HTTP/2 over cleartext (with prior knowledge), and adds latency to every response and caps
+the bandwidth of every connection.
+
+    python -m benchmarks.server DIR [--port 8080] [--latency 0.02] [--bandwidth 20M]
+
+Counters of requests and bytes sent are served as JSON at /_stats (and reset by /_stats?reset).
+"""
+import os
+import json
+import asyncio
+import argparse
+import email.utils
+
+from urllib.parse import unquote
+
+import h2.config
+import h2.events
+import h2.exceptions
+import h2.connection
+
+CHUNK_SIZE = 64 * 1024
+H2_PREFACE = b'PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n'
+BOUNDARY = 'zipinspect-benchmark-boundary'
+
+REASONS = {
+    200: 'OK',
+    206: 'Partial Content',
+    304: 'Not Modified',
+    404: 'Not Found',
+    416: 'Range Not Satisfiable',
+}
+
+
+def parse_size(value):
+    """Parse a size like 512K, 20M or 1G into bytes."""
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    value = value.strip().upper().removesuffix('B')
+
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def parse_ranges(value, size):
+    """Ranges of a Range header as [start, end) pairs; None if there's none to honour,
+    and an empty list if none of them is satisfiable."""
+    if not value or not value.startswith('bytes='):
+        return None
+
+    ranges = []
+    for spec in value[6:].split(','):
+        first, _, last = spec.strip().partition('-')
+        if not first:
+            start, end = max(size - int(last), 0), size
+        else:
+            start, end = int(first), min(int(last) + 1, size) if last else size
+
+        if start < end:
+            ranges.append((start, end))
+
+    return ranges
+
+
+class Throttle:
+    """Token bucket capping the bandwidth of a connection, in bytes per second."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._next = 0.0
+
+    async def __call__(self, n):
+        if not self.rate:
+            return
+
+        now = asyncio.get_running_loop().time()
+        self._next = max(self._next, now) + n / self.rate
+        if (delay := self._next - now) > 0:
+            await asyncio.sleep(delay)
+
+
+class RangeServer:
+    def __init__(self, root, *, latency=0.0, bandwidth=None, multipart=True):
+        self.root = os.path.abspath(root)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.multipart = multipart
+        self.requests = 0
+        self.bytes_sent = 0
+
+    def respond(self, method, target, headers):
+        """Status, headers and body of the response to a request. The body is a list of
+        segments, each either bytes or a (path, start, end) range of a file."""
+        path, _, query = target.partition('?')
+
+        if path == '/_stats':
+            body = json.dumps({'requests': self.requests, 'bytes': self.bytes_sent}).encode()
+            if 'reset' in query:
+                self.requests = self.bytes_sent = 0
+            return 200, [('content-type', 'application/json'), ('content-length', str(len(body)))], [body]
+
+        self.requests += 1
+        file = os.path.join(self.root, os.path.normpath('/' + unquote(path)).lstrip('/'))
+        try:
+            st = os.stat(file)
+        except OSError:
+            return 404, [('content-length', '0')], []
+
+        size = st.st_size
+        etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        common = [('accept-ranges', 'bytes'), ('etag', etag),
+                  ('last-modified', email.utils.formatdate(st.st_mtime, usegmt=True))]
+
+        if headers.get('if-none-match') == etag:
+            return 304, common + [('content-length', '0')], []
+
+        ranges = parse_ranges(headers.get('range'), size)
+        if ranges is None:
+            status, body = 200, [(file, 0, size)]
+            common.append(('content-length', str(size)))
+        elif not ranges:
+            return 416, common + [('content-range', f'bytes */{size}'), ('content-length', '0')], []
+        elif len(ranges) == 1 or not self.multipart:
+            (start, end), = ranges[:1]
+            status, body = 206, [(file, start, end)]
+            common += [('content-range', f'bytes {start}-{end - 1}/{size}'),
+                       ('content-length', str(end - start))]
+        else:
+            status, body = 206, []
+            for start, end in ranges:
+                body.append((f'\r\n--{BOUNDARY}\r\n'
+                             f'Content-Type: application/zip\r\n'
+                             f'Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n').encode())
+                body.append((file, start, end))
+            body.append(f'\r\n--{BOUNDARY}--\r\n'.encode())
+
+            length = sum(len(part) if isinstance(part, bytes) else part[2] - part[1] for part in body)
+            common += [('content-type', f'multipart/byteranges; boundary={BOUNDARY}'),
+                       ('content-length', str(length))]
+
+        return status, common, body if method != 'HEAD' else []
+
+    @staticmethod
+    def chunks(body):
+        for segment in body:
+            if isinstance(segment, bytes):
+                yield segment
+                continue
+
+            path, start, end = segment
+            with open(path, 'rb') as f:
+                while start < end:
+                    chunk = os.pread(f.fileno(), min(CHUNK_SIZE, end - start), start)
+                    start += len(chunk)
+                    yield chunk
+
+    async def handle(self, reader, writer):
+        throttle = Throttle(self.bandwidth)
+        try:
+            line = await reader.readline()
+            if line == b'PRI * HTTP/2.0\r\n':
+                # The rest of the preface of HTTP/2
+                if await reader.readexactly(len(H2_PREFACE) - len(line)) == H2_PREFACE[len(line):]:
+                    await self._handle_h2(reader, writer, throttle)
+            else:
+                await self._handle_http1(reader, writer, throttle, line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_http1(self, reader, writer, throttle, line):
+        while line:
+            if not line.strip():
+                line = await reader.readline()
+                continue
+
+            method, target, _ = line.decode('latin-1').split(' ', 2)
+            headers = {}
+            while (line := await reader.readline()).strip():
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            await asyncio.sleep(self.latency)
+            status, response_headers, body = self.respond(method, target, headers)
+
+            writer.write(f'HTTP/1.1 {status} {REASONS[status]}\r\n'.encode())
+            writer.write(''.join(f'{name}: {value}\r\n' for name, value in response_headers).encode())
+            writer.write(b'\r\n')
+
+            for chunk in self.chunks(body):
+                await throttle(len(chunk))
+                writer.write(chunk)
+                await writer.drain()
+                self.bytes_sent += len(chunk)
+            await writer.drain()
+
+            if headers.get('connection', '').lower() == 'close':
+                break
+            line = await reader.readline()
+
+    async def _handle_h2(self, reader, writer, throttle):
+        conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False,
+                                                                    header_encoding='utf-8'))
+        conn.initiate_connection()
+        conn.receive_data(H2_PREFACE)
+        writer.write(conn.data_to_send())
+
+        # Signalled whenever the peer opens up a flow control window.
+        window = asyncio.Event()
+        streams = {}
+
+        async def serve(stream_id, headers):
+            await asyncio.sleep(self.latency)
+            status, response_headers, body = self.respond(headers[':method'], headers[':path'], headers)
+
+            conn.send_headers(stream_id, [(':status', str(status)), *response_headers], end_stream=not body)
+            writer.write(conn.data_to_send())
+
+            for chunk in self.chunks(body):
+                while chunk:
+                    size = min(conn.local_flow_control_window(stream_id), conn.max_outbound_frame_size)
+                    if size <= 0:
+                        window.clear()
+                        await window.wait()
+                        continue
+
+                    await throttle(size)
+                    conn.send_data(stream_id, chunk[:size])
+                    writer.write(conn.data_to_send())
+                    await writer.drain()
+                    self.bytes_sent += len(chunk[:size])
+                    chunk = chunk[size:]
+
+            if body:
+                conn.end_stream(stream_id)
+                writer.write(conn.data_to_send())
+
+        async def serve_stream(stream_id, headers):
+            try:
+                await serve(stream_id, headers)
+            except h2.exceptions.StreamClosedError:
+                pass
+            finally:
+                streams.pop(stream_id, None)
+
+        try:
+            while data := await reader.read(CHUNK_SIZE):
+                for event in conn.receive_data(data):
+                    match event:
+                        case h2.events.RequestReceived():
+                            streams[event.stream_id] = asyncio.create_task(
+                                serve_stream(event.stream_id, dict(event.headers)))
+                        case h2.events.WindowUpdated() | h2.events.RemoteSettingsChanged():
+                            window.set()
+                        case h2.events.StreamReset():
+                            if task := streams.pop(event.stream_id, None):
+                                task.cancel()
+                        case h2.events.ConnectionTerminated():
+                            return
+
+                writer.write(conn.data_to_send())
+        finally:
+            for task in streams.values():
+                task.cancel()
+
+    async def start(self, host='127.0.0.1', port=0):
+        """Start serving; returns the asyncio server, and the port it listens on."""
+        server = await asyncio.start_server(self.handle, host, port)
+        return server, server.sockets[0].getsockname()[1]
+
+
+async def serve_forever(args):
+    server, port = await RangeServer(args.directory, latency=args.latency,
+                                     bandwidth=args.bandwidth and parse_size(args.bandwidth),
+                                     multipart=not args.no_multipart).start(args.host, args.port)
+    print(f"Serving {args.directory} on http://{args.host}:{port}/", flush=True)
+
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Range-serving HTTP/1.1 and HTTP/2 server for benchmarks")
+    parser.add_argument('directory')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--bandwidth', help="cap per connection, e.g. 20M for 20 MiB/s")
+    parser.add_argument('--no-multipart', action='store_true', help="answer only the first of several ranges")
+
+    asyncio.run(serve_forever(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
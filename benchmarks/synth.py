@@ -0,0 +1,87 @@
+"""Synthetic archives for benchmarks, generated deterministically from their parameters."""
+import os
+import random
+import struct
+import zipfile
+
+from contextlib import contextmanager, nullcontext
+
+METHODS = {
+    'stored': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
+# NOTE Zstandard is only supported by zipfile as of Python 3.14.
+if hasattr(zipfile, 'ZIP_ZSTANDARD'):
+    METHODS['zstd'] = zipfile.ZIP_ZSTANDARD
+
+WORDS = [b'zip', b'range', b'request', b'central', b'directory', b'entry', b'deflate',
+         b'stream', b'header', b'offset', b'archive', b'byte', b'local', b'extra']
+
+
+@contextmanager
+def _forced_zip64():
+    """Make zipfile write Zip64 records even where they aren't needed."""
+    limits = zipfile.ZIP64_LIMIT, zipfile.ZIP_FILECOUNT_LIMIT
+    zipfile.ZIP64_LIMIT, zipfile.ZIP_FILECOUNT_LIMIT = 0, 0
+    try:
+        yield
+    finally:
+        zipfile.ZIP64_LIMIT, zipfile.ZIP_FILECOUNT_LIMIT = limits
+
+
+def _saturate_eocd(path):
+    """Saturate the fields of the EOCD, as if they all overflowed, so that readers have to
+    go by the Zip64 EOCD; zipfile only does so for the fields that really overflow."""
+    with open(path, 'r+b') as f:
+        f.seek(-22, os.SEEK_END)
+        signature = f.read(4)
+        assert signature == b'PK\x05\x06', "Archive ends with a comment"
+        f.write(struct.pack('<HHHHII', 0, 0, 0xFFFF, 0xFFFF, 0xFFFFFFFF, 0xFFFFFFFF))
+
+
+def _content(rnd, size):
+    """Half random, half text-like bytes, so that every method has something to compress."""
+    noise = rnd.randbytes(size // 2)
+    text = b' '.join(rnd.choices(WORDS, k=size // 6 + 1))
+
+    return (noise + text)[:size]
+
+
+def archive_name(count, size, methods, zip64=False):
+    return f"synth-{count}x{size}-{'+'.join(methods)}{'-zip64' if zip64 else ''}.zip"
+
+
+def make_archive(directory, *, count, size, methods=tuple(METHODS), zip64=False, seed=0):
+    """Generate an archive of `count' entries of about `size' bytes each, compressed with the
+    given methods in turn, unless it exists already; returns its path. Entries are spread
+    over directories of a hundred, and sizes vary exponentially around `size'."""
+    methods = [method for method in methods if method in METHODS]
+    path = os.path.join(directory, archive_name(count, size, methods, zip64))
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(directory, exist_ok=True)
+    rnd = random.Random(seed)
+    # Contents are drawn from a pool, since generating them is slower than compressing them.
+    pool = [_content(rnd, size * 4) for _ in range(8)] if size else [b'']
+
+    with _forced_zip64() if zip64 else nullcontext(), \
+            zipfile.ZipFile(path + '.tmp', 'w') as zf:
+        for i in range(count):
+            entry_size = min(int(rnd.expovariate(1 / size)), size * 4) if size else 0
+            info = zipfile.ZipInfo(f'd{i // 100:05}/f{i:07}.bin', date_time=(2024, 1, 1, 0, 0, 0))
+            info.compress_type = METHODS[methods[i % len(methods)]]
+
+            data = rnd.choice(pool)
+            offset = rnd.randrange(len(data) - entry_size + 1)
+            # NOTE Sizes are checked against the patched limits too, unless Zip64 is forced.
+            with zf.open(info, 'w', force_zip64=zip64) as f:
+                f.write(data[offset:offset + entry_size])
+
+    if zip64:
+        _saturate_eocd(path + '.tmp')
+    os.replace(path + '.tmp', path)
+    return path
+
@@ -0,0 +1,52 @@
+import os
+import zipfile
+
+import httpx
+import pytest
+
+from benchmarks.server import RangeServer
+from zipinspect.zipread import HTTPZipReader
+
+
+def make_zip(path, files, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, 'w', compression) as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+
+
+class MockServer:
+    """`RangeServer' of the benchmarks behind an httpx mock transport, counting the bytes
+    it sends; `failures' is how many of the next requests it answers with a 503."""
+
+    def __init__(self, root, **kwargs):
+        self.server = RangeServer(root, **kwargs)
+        self.bytes_sent = 0
+        self.failures = 0
+        self.ranges = []
+
+    def handle(self, request):
+        self.ranges.append(request.headers.get('range'))
+        if self.failures:
+            self.failures -= 1
+            return httpx.Response(503)
+
+        status, headers, body = self.server.respond(request.method, request.url.raw_path.decode(),
+                                                    dict(request.headers))
+        content = b''.join(RangeServer.chunks(body))
+        self.bytes_sent += len(content)
+        return httpx.Response(status, headers=headers, content=content)
+
+    def reader(self, name, **kwargs):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+        return HTTPZipReader(f'http://test/{name}', client=client, **kwargs)
+
+
+@pytest.fixture
+def server(tmp_path):
+    return MockServer(tmp_path)
+
+
+@pytest.fixture
+def random_files():
+    # NOTE Random data doesn't compress, so entries are about as large stored as deflated.
+    return {f'{i:02}.bin': os.urandom(100_000 + i) for i in range(12)}
@@ -0,0 +1,16 @@
+from benchmarks.run import compare
+
+
+def result(seconds, requests=1):
+    return {'list': {'seconds': seconds, 'requests': requests}, 'peak_rss_mb': 10}
+
+
+def test_small_slowdowns_not_regressions():
+    _, regressed = compare({'tiny': result(0.002)}, {'tiny': result(0.001)}, 0.25)
+    assert not regressed
+
+    _, regressed = compare({'tiny': result(1.0)}, {'tiny': result(0.5)}, 0.25)
+    assert regressed
+
+    _, regressed = compare({'tiny': result(0.001, requests=2)}, {'tiny': result(0.001)}, 0.25)
+    assert regressed
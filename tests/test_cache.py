@@ -0,0 +1,35 @@
+import asyncio
+
+from zipinspect.zipread import IndexCache
+
+from .conftest import make_zip
+
+
+async def load(server, cache):
+    async with server.reader('a.zip', cache=cache) as z:
+        await z.wait_loaded()
+        return [(info.path, info.file_size, info.raw_offset) for info in z.entries]
+
+
+def test_cache_hit(server, tmp_path, random_files):
+    make_zip(tmp_path / 'a.zip', random_files)
+    cache = IndexCache(str(tmp_path / 'cache'))
+    entries = asyncio.run(load(server, cache))
+
+    sent = server.bytes_sent
+    requests = len(server.ranges)
+    assert asyncio.run(load(server, cache)) == entries
+    # Only the tail is asked for, conditionally, and nothing comes back.
+    assert len(server.ranges) == requests + 1
+    assert server.bytes_sent == sent
+
+
+def test_cache_invalidated(server, tmp_path, random_files):
+    make_zip(tmp_path / 'a.zip', random_files)
+    cache = IndexCache(str(tmp_path / 'cache'))
+    asyncio.run(load(server, cache))
+
+    make_zip(tmp_path / 'a.zip', {'new.txt': b'new' * 1000})
+    assert [path for path, *_ in asyncio.run(load(server, cache))] == ['new.txt']
+    # The index of the archive as it is now replaces the stale one.
+    assert [info.path for info in cache.load('http://test/a.zip').entries] == ['new.txt']
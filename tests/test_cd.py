@@ -0,0 +1,81 @@
+import asyncio
+import zipfile
+
+import pytest
+
+from zipinspect import open_reader
+from zipinspect.zipread import ZipReader, rangesource
+
+
+def make_cd_zip(path, n, *, tricky=False):
+    """An archive of `n' empty entries; with `tricky', signatures of central directory
+    records turn up in names, extra fields and comments."""
+    with zipfile.ZipFile(path, 'w') as zf:
+        for i in range(n):
+            info = zipfile.ZipInfo(f'd{i % 7}/{i}' + ('PK\x01\x02' if tricky and i % 5 == 0 else ''))
+            if tricky and i % 11 == 0:
+                info.extra = b'\xaa\xbb\x04\x00PK\x01\x02'
+            if tricky and i % 13 == 0:
+                info.comment = b'PK\x01\x02'
+            zf.writestr(info, b'x' * (i % 3))
+
+
+def listed(z):
+    return [(info.path, info.file_size, info.compressed_size, info.raw_offset, info.checksum)
+            for info in z.entries]
+
+
+def expected(path):
+    with zipfile.ZipFile(path) as zf:
+        return [(info.filename, info.file_size, info.compress_size, info.header_offset, info.CRC)
+                for info in zf.infolist()]
+
+
+@pytest.fixture
+def serial_calls(monkeypatch):
+    """Numbers of records parsed one by one rather than in bulk, by call."""
+    calls = []
+    parse = ZipReader._parse_cd_serial
+
+    def parse_serial(self, cd):
+        columns, paths, pos = parse(self, cd)
+        calls.append(len(columns['raw_offset']))
+        return columns, paths, pos
+
+    monkeypatch.setattr(ZipReader, '_parse_cd_serial', parse_serial)
+    return calls
+
+
+@pytest.mark.parametrize('tricky', [False, True])
+def test_bulk_parse(server, tmp_path, serial_calls, tricky):
+    make_cd_zip(tmp_path / 'a.zip', 3000, tricky=tricky)
+
+    async def main():
+        # NOTE The central directory doesn't fit the tail, so it's streamed in.
+        async with server.reader('a.zip', tail_size=4096) as z:
+            await z.wait_loaded()
+            return listed(z)
+
+    assert asyncio.run(main()) == expected(tmp_path / 'a.zip')
+    # Signatures where they don't belong are only dealt with by parsing one by one; otherwise,
+    # that's left for a lone record at the end of a chunk.
+    if tricky:
+        assert sum(serial_calls) > 100
+    else:
+        assert sum(serial_calls) <= 2
+
+
+@pytest.mark.parametrize('chunk_size', [7, 1000, 65536])
+def test_bulk_parse_in_chunks(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(rangesource, 'CHUNK_SIZE', chunk_size)
+    with monkeypatch.context() as m:
+        # Every entry gets a Zip64 extra field.
+        m.setattr(zipfile, 'ZIP64_LIMIT', 0)
+        make_cd_zip(tmp_path / 'a.zip', 500, tricky=True)
+
+    async def main():
+        async with open_reader([str(tmp_path / 'a.zip')], tail_size=64) as z:
+            await z.wait_loaded()
+            return listed(z)
+
+    assert asyncio.run(main()) == expected(tmp_path / 'a.zip')
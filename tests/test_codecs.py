@@ -0,0 +1,31 @@
+import io
+import os
+import zlib
+import zipfile
+
+import pytest
+
+from zipinspect.zipread.codecs import crc32_combine, make_decompressor
+from zipinspect.zipread.entries import ZipCompression
+
+
+@pytest.mark.parametrize('size', [0, 1, 7, 4096, 1_000_003])
+def test_crc32_combine(size):
+    first, second = os.urandom(100), os.urandom(size)
+    assert crc32_combine(zlib.crc32(first), zlib.crc32(second), size) == zlib.crc32(first + second)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 4096])
+def test_lzma_decompressor(chunk_size):
+    data = os.urandom(1000) * 50
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_LZMA) as zf:
+        zf.writestr('a.bin', data)
+        info = zf.infolist()[0]
+
+    # Raw data of the entry, past its local file header.
+    start = info.header_offset + 30 + len(info.filename.encode())
+    raw = buffer.getvalue()[start:start + info.compress_size]
+    decompressor = make_decompressor(ZipCompression.LZMA)
+    assert b''.join(decompressor.decompress(raw[i:i + chunk_size])
+                    for i in range(0, len(raw), chunk_size)) == data
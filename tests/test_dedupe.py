@@ -0,0 +1,43 @@
+import os
+import asyncio
+
+import pytest
+
+from zipinspect import extract_entries
+
+from .conftest import make_zip
+
+
+@pytest.mark.parametrize('dedupe', ['reflink', 'hardlink', 'copy'])
+def test_duplicates_downloaded_once(server, tmp_path, monkeypatch, dedupe):
+    monkeypatch.chdir(tmp_path)
+    data = os.urandom(300_000)
+    files = {'a.bin': data, 'b.bin': os.urandom(300_000), 'dir/a-copy.bin': data, 'empty': b''}
+    make_zip(tmp_path / 'a.zip', files)
+
+    async def main():
+        # NOTE A small tail, so that it doesn't take in the data of any entry.
+        async with server.reader('a.zip', tail_size=4096) as z:
+            await extract_entries(z, list(z.entries), out_dir='out', dedupe=dedupe, verify=True)
+
+    asyncio.run(main())
+    for path, contents in files.items():
+        assert (tmp_path / 'out' / path).read_bytes() == contents
+    # Two of the three large entries, and the tail.
+    assert server.bytes_sent < 650_000
+    if dedupe == 'hardlink':
+        assert (tmp_path / 'out' / 'a.bin').samefile(tmp_path / 'out' / 'dir' / 'a-copy.bin')
+
+
+def test_no_dedupe(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data = os.urandom(300_000)
+    make_zip(tmp_path / 'a.zip', {'a.bin': data, 'b.bin': data})
+
+    async def main():
+        async with server.reader('a.zip') as z:
+            await extract_entries(z, list(z.entries), out_dir='out', dedupe=None)
+
+    asyncio.run(main())
+    assert (tmp_path / 'out' / 'b.bin').read_bytes() == data
+    assert server.bytes_sent > 600_000
@@ -0,0 +1,28 @@
+import asyncio
+
+import httpx
+
+from zipinspect.zipread import HTTPZipReader
+
+from .conftest import make_zip
+
+
+def test_failed_mirrors_dropped(server, tmp_path, random_files):
+    make_zip(tmp_path / 'a.zip', random_files)
+
+    def handle(request):
+        if request.url.host == 'down':
+            raise httpx.ConnectError("Connection refused", request=request)
+        if request.url.host == 'broken':
+            raise RuntimeError("Broken mirror")
+        return server.handle(request)
+
+    async def main():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+        urls = [f'http://{host}/a.zip' for host in ('test', 'down', 'broken', 'mirror')]
+        async with HTTPZipReader(urls, client=client) as z:
+            await z._prober
+            assert z.mirrors == ['http://mirror/a.zip']
+            assert len(z.sources) == 2
+
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+import io
+import asyncio
+
+from zipinspect.zipread import httpreader
+from zipinspect.zipread.blocks import BlockCache
+from zipinspect.zipread.planner import plan_ranges
+
+from .conftest import make_zip
+
+
+class Output(io.BytesIO):
+    def close(self):
+        self.data = self.getvalue()
+        super().close()
+
+
+async def extract(z, infos):
+    """Extract entries with `extract_spans', in a single batch; their contents by path."""
+    outputs = {}
+
+    def open_output(info):
+        outputs[info.path] = Output()
+        return outputs[info.path]
+
+    async for _ in z.extract_spans(plan_ranges(infos, max_gap=0, limit=z.size), open_output):
+        pass
+
+    return {path: f.data for path, f in outputs.items()}
+
+
+def test_multirange_retried_on_server_error(server, tmp_path, random_files, monkeypatch):
+    monkeypatch.setattr(httpreader, 'RETRY_DELAY', 0)
+    make_zip(tmp_path / 'a.zip', random_files)
+
+    async def main():
+        async with server.reader('a.zip') as z:
+            infos = list(z.entries)[::2]
+            server.failures = 1
+            assert await extract(z, infos) == {info.path: random_files[info.path] for info in infos}
+            assert z.multipart
+
+    asyncio.run(main())
+    # The tail, then the same multi-range request twice, and nothing per span.
+    assert len(server.ranges) == 3 and server.ranges[1] == server.ranges[2]
+
+
+def test_reextract_served_from_blocks(server, tmp_path, random_files):
+    make_zip(tmp_path / 'a.zip', random_files)
+
+    async def main():
+        async with server.reader('a.zip', blocks=BlockCache()) as z:
+            infos = list(z.entries)[::2]
+            first = await extract(z, infos)
+            assert z.multipart
+
+            sent = server.bytes_sent
+            assert await extract(z, infos) == first
+            assert server.bytes_sent == sent
+
+    asyncio.run(main())
@@ -0,0 +1,28 @@
+import io
+import asyncio
+import zipfile
+
+from zipinspect.zipread.blocks import BlockCache
+
+from .conftest import make_zip
+from .test_multipart import extract
+
+
+def test_nested_served_from_parent_blocks(server, tmp_path, random_files):
+    inner = io.BytesIO()
+    make_zip(inner, random_files, zipfile.ZIP_STORED)
+    make_zip(tmp_path / 'a.zip', {'pad.bin': random_files['00.bin'], 'inner.zip': inner.getvalue()},
+             zipfile.ZIP_STORED)
+
+    async def main():
+        async with server.reader('a.zip', blocks=BlockCache()) as z:
+            info, = (info for info in z.entries if info.path == 'inner.zip')
+            async with z.open_archive(info) as nested:
+                infos = list(nested.entries)[::2]
+                assert await extract(nested, infos) == {info.path: random_files[info.path] for info in infos}
+
+                sent = server.bytes_sent
+                assert await extract(nested, infos) == {info.path: random_files[info.path] for info in infos}
+                assert server.bytes_sent == sent
+
+    asyncio.run(main())
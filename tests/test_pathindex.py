@@ -0,0 +1,89 @@
+import asyncio
+import zipfile
+
+import pytest
+
+from zipinspect import select_entries
+from zipinspect.zipread import ZipError
+
+
+def make_tree_zip(path):
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr('docs/', b'')
+        zf.writestr(zipfile.ZipInfo('docs/a.txt', (2020, 1, 1, 0, 0, 0)), b'a' * 10)
+        zf.writestr(zipfile.ZipInfo('docs/b.md', (2022, 1, 1, 0, 0, 0)), b'b' * 1000)
+        zf.writestr(zipfile.ZipInfo('docs/sub/c.txt', (2024, 1, 1, 0, 0, 0)), b'c' * 100)
+        # NOTE There's no entry of `src/' itself; it's implied by its contents.
+        zf.writestr('src/main.py', b'')
+        zf.writestr('docsx.txt', b'')
+        zf.writestr('README', b'')
+
+
+@pytest.fixture
+def tree(server, tmp_path):
+    make_tree_zip(tmp_path / 'a.zip')
+    return server
+
+
+def with_index(server, fn):
+    async def main():
+        async with server.reader('a.zip') as z:
+            index = await z.path_index()
+            return fn(z, index)
+
+    return asyncio.run(main())
+
+
+def paths(z, indices):
+    return [z.entries[i].path for i in indices]
+
+
+def test_lookup(tree):
+    def check(z, index):
+        assert z.entries[index.lookup('docs/sub/c.txt')].path == 'docs/sub/c.txt'
+        assert z.entries[index.lookup('docs/')].is_dir
+        assert index.lookup('docs') is None
+        assert index.lookup('nope') is None
+
+    with_index(tree, check)
+
+
+def test_subtree_and_dirs(tree):
+    def check(z, index):
+        assert paths(z, index.subtree('docs/')) == ['docs/', 'docs/a.txt', 'docs/b.md', 'docs/sub/c.txt']
+        assert index.is_dir('docs') and index.is_dir('src') and index.is_dir('docs/sub/')
+        assert not index.is_dir('README') and not index.is_dir('doc')
+
+    with_index(tree, check)
+
+
+def test_children(tree):
+    def check(z, index):
+        assert list(index.children('')) == ['README', 'docs/', 'docsx.txt', 'src/']
+        assert list(index.children('docs/')) == ['a.txt', 'b.md', 'sub/']
+
+    with_index(tree, check)
+
+
+def test_find(tree):
+    def check(z, index):
+        assert paths(z, index.find('docs/*.txt')) == ['docs/a.txt', 'docs/sub/c.txt']
+        assert paths(z, index.find(r'\.(md|py)$', regex=True)) == ['docs/b.md', 'src/main.py']
+        assert paths(z, index.find('docs/*', min_size=50, max_size=500)) == ['docs/sub/c.txt']
+        assert paths(z, index.find('docs/?.*', after=(2021, 1, 1, 0, 0, 0),
+                                   before=(2023, 1, 1, 0, 0, 0))) == ['docs/b.md']
+
+    with_index(tree, check)
+
+
+def test_select_entries(tree):
+    async def main():
+        async with tree.reader('a.zip') as z:
+            selected = await select_entries(z, ['docs', 'README'], ['src/*'])
+            assert sorted(info.path for info in selected) == \
+                ['README', 'docs/a.txt', 'docs/b.md', 'docs/sub/c.txt', 'src/main.py']
+
+            with pytest.raises(ZipError):
+                await select_entries(z, ['nope'], [])
+
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+import io
+import asyncio
+import zipfile
+
+from .conftest import make_zip
+
+
+class Unseekable(io.RawIOBase):
+    """A file zipfile can't seek back in, so that it writes data descriptors."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.f.write(data)
+
+
+async def repack(z, entries, path):
+    with open(path, 'wb') as f:
+        async for _ in z.repack(entries, f):
+            pass
+
+
+def check(path, files):
+    with zipfile.ZipFile(path) as zf:
+        assert zf.testzip() is None
+        assert {info.filename: zf.read(info) for info in zf.infolist()} == files
+
+
+def test_repack(server, tmp_path, random_files):
+    make_zip(tmp_path / 'a.zip', random_files)
+
+    async def main():
+        async with server.reader('a.zip') as z:
+            entries = list(z.entries)[::3]
+            await repack(z, entries, tmp_path / 'b.zip')
+            return {info.path for info in entries}
+
+    selected = asyncio.run(main())
+    check(tmp_path / 'b.zip', {path: random_files[path] for path in selected})
+
+
+def test_repack_descriptors_and_zip64(server, tmp_path, random_files):
+    with open(tmp_path / 'a.zip', 'wb') as f, zipfile.ZipFile(Unseekable(f), 'w', zipfile.ZIP_DEFLATED) as zf:
+        for i, (name, data) in enumerate(random_files.items()):
+            with zf.open(name, 'w', force_zip64=i % 2 == 0) as entry:
+                entry.write(data)
+
+    with zipfile.ZipFile(tmp_path / 'a.zip') as zf:
+        assert all(info.flag_bits & 0x08 for info in zf.infolist())
+
+    async def main():
+        async with server.reader('a.zip') as z:
+            await repack(z, list(z.entries), tmp_path / 'b.zip')
+
+    asyncio.run(main())
+    check(tmp_path / 'b.zip', random_files)
@@ -0,0 +1,85 @@
+import os
+import asyncio
+import zipfile
+from contextlib import nullcontext
+
+import pytest
+
+from zipinspect import open_reader
+from zipinspect.zipread import ZipError
+from zipinspect.zipread.resume import ResumeState, entry_identity
+from zipinspect.utils.writer import WriteBehind
+
+from .conftest import make_zip
+
+
+async def extract(z, info, path, *, spool=False, segments=1, writer=None):
+    with ResumeState.open(path, entry_identity(z, info), spool=spool) as state, \
+            state.open_output(writer, info.file_size) as output:
+        async for _ in z.extract(info, output, segments=segments, resume=state):
+            pass
+
+
+def test_stored_resume_checks_crc(tmp_path):
+    data = os.urandom(300_000)
+    make_zip(tmp_path / 'a.zip', {'a.bin': data}, zipfile.ZIP_STORED)
+    out = str(tmp_path / 'a.bin')
+
+    async def main():
+        async with open_reader([str(tmp_path / 'a.zip')]) as z:
+            info = z.entries[0]
+
+            # An earlier extraction got half of it, which was corrupted since.
+            state = ResumeState.open(out, entry_identity(z, info))
+            with state.open_output() as output:
+                output.write(data[:150_000])
+                output.seek(1000)
+                output.write(b'\0' * 10)
+            state.record(0, 150_000)
+            state.save()
+            state.close()
+
+            with pytest.raises(ZipError, match='CRC mismatch'):
+                await extract(z, info, out, segments=2)
+
+            # It starts over the next time.
+            await extract(z, info, out, segments=3)
+
+        with open(out, 'rb') as f:
+            assert f.read() == data
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize('behind', [False, True])
+def test_spool_resume_checks_crc(tmp_path, behind):
+    data = os.urandom(300_000)
+    # NOTE Deflate at level 0 is made of stored blocks, so a corrupt byte is still valid Deflate.
+    with zipfile.ZipFile(tmp_path / 'a.zip', 'w', zipfile.ZIP_DEFLATED, compresslevel=0) as zf:
+        zf.writestr('a.bin', data)
+    out = str(tmp_path / 'a.bin')
+
+    async def main():
+        async with open_reader([str(tmp_path / 'a.zip')]) as z:
+            info = z.entries[0]
+            offset = await z._calc_data_offset(info.raw_offset)
+            compressed = bytearray(await z._read(offset, offset + 150_000))
+            compressed[1000] ^= 0xFF
+
+            state = ResumeState.open(out, entry_identity(z, info), spool=True)
+            state.spool(compressed)
+            state.save()
+            state.close()
+
+            with WriteBehind() if behind else nullcontext() as writer:
+                with pytest.raises(ZipError, match='CRC mismatch'):
+                    await extract(z, info, out, spool=True, writer=writer)
+
+            with WriteBehind() if behind else nullcontext() as writer:
+                # It starts over the next time.
+                await extract(z, info, out, spool=True, writer=writer)
+
+        with open(out, 'rb') as f:
+            assert f.read() == data
+
+    asyncio.run(main())
@@ -0,0 +1,13 @@
+from types import SimpleNamespace
+
+from zipinspect.zipread import stats
+
+
+def test_entries_bounded(monkeypatch):
+    monkeypatch.setattr(stats, 'ENTRY_LOG_SIZE', 10)
+    s = stats.TransferStats()
+    for i in range(25):
+        s.record_entry(SimpleNamespace(path=f'{i}.bin', compressed_size=100, file_size=200), 0.5)
+
+    assert s.entry_count == 25 and s.entry_bytes == 2500
+    assert [entry['path'] for entry in s.to_dict()['entries']] == [f'{i}.bin' for i in range(15, 25)]
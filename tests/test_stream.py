@@ -0,0 +1,24 @@
+import io
+import asyncio
+
+from zipinspect.zipread import httpreader
+
+from .conftest import make_zip
+
+
+def test_range_retried_on_server_error(server, tmp_path, random_files, monkeypatch):
+    monkeypatch.setattr(httpreader, 'RETRY_DELAY', 0)
+    make_zip(tmp_path / 'a.zip', random_files)
+
+    async def main():
+        async with server.reader('a.zip') as z:
+            info = z.entries[3]
+            output = io.BytesIO()
+            server.failures = 1
+            async for _ in z.extract(info, output):
+                pass
+            assert output.getvalue() == random_files[info.path]
+
+    asyncio.run(main())
+    # The tail, then the same range twice.
+    assert len(server.ranges) == 3 and server.ranges[1] == server.ranges[2]
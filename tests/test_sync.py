@@ -0,0 +1,77 @@
+import os
+import asyncio
+
+import pytest
+
+from zipinspect import open_reader, sync_entries, extract_entries
+from zipinspect.zipread import HTTPError, Manifest
+from zipinspect.zipread import httpreader
+
+from .conftest import make_zip
+
+
+async def sync(archive, out_dir, paths=None, **kwargs):
+    async with open_reader([str(archive)]) as z:
+        entries = [info for info in z.entries if paths is None or info.path in paths]
+        await sync_entries(z, entries, out_dir=str(out_dir), **kwargs)
+
+
+def test_selective_sync_keeps_unselected(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    archive = tmp_path / 'a.zip'
+    make_zip(archive, {'a.txt': b'a' * 1000, 'b.txt': b'b' * 1000, 'c.txt': b'c' * 1000})
+    out = tmp_path / 'out'
+
+    asyncio.run(sync(archive, out))
+    asyncio.run(sync(archive, out, {'a.txt'}, delete=True))
+
+    assert sorted(p.name for p in out.iterdir() if not p.name.startswith('.')) == ['a.txt', 'b.txt', 'c.txt']
+
+
+def test_sync_deletes_removed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    archive = tmp_path / 'a.zip'
+    make_zip(archive, {'a.txt': b'a' * 1000, 'b.txt': b'b' * 1000})
+    out = tmp_path / 'out'
+    asyncio.run(sync(archive, out))
+
+    make_zip(archive, {'a.txt': b'A' * 1000})
+    asyncio.run(sync(archive, out, {'a.txt'}, delete=True))
+
+    assert not (out / 'b.txt').exists()
+    assert (out / 'a.txt').read_bytes() == b'A' * 1000
+
+
+def test_failed_extract_not_taken_as_synced(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(httpreader, 'RETRY_DELAY', 0)
+    # NOTE Files this large are preallocated, so they're of the right size from the start.
+    files = {'a.bin': os.urandom(1_500_000), 'b.bin': os.urandom(1_500_000)}
+    make_zip(tmp_path / 'a.zip', files)
+    out = tmp_path / 'out'
+
+    async def extract(fail=False):
+        async with server.reader('a.zip') as z:
+            manifest = Manifest.load(str(out))
+            server.failures = 100 if fail else 0
+            await extract_entries(z, list(z.entries), out_dir=str(out), manifest=manifest, resume=False)
+            manifest.save()
+
+    async def sync():
+        server.failures = 0
+        async with server.reader('a.zip') as z:
+            await sync_entries(z, list(z.entries), out_dir=str(out))
+
+    asyncio.run(extract())
+    with pytest.raises(ExceptionGroup) as excinfo:
+        asyncio.run(extract(fail=True))
+    assert excinfo.group_contains(HTTPError)
+    # Files cut short are removed, those not got to are left as they were, and none of them
+    # is recorded as extracted any longer.
+    for name, data in files.items():
+        assert not (out / name).exists() or (out / name).read_bytes() == data
+    assert not Manifest.load(str(out)).files
+
+    asyncio.run(sync())
+    for name, data in files.items():
+        assert (out / name).read_bytes() == data
@@ -0,0 +1,67 @@
+import os
+import asyncio
+import threading
+
+import pytest
+
+import zipinspect
+
+from zipinspect import open_reader, extract_entries
+from zipinspect.utils.writer import WriteBehind
+
+from .conftest import make_zip
+
+
+def test_drain_waits_without_blocking(tmp_path):
+    unblock = threading.Event()
+
+    async def main():
+        with WriteBehind(threads=1, max_buffered=10) as writer:
+            with writer.open(str(tmp_path / 'a')) as f:
+                # The writer is held up until the event loop sets the event.
+                f.when_written(unblock.wait)
+                f.write(b'x' * 100)
+
+                asyncio.get_running_loop().call_later(0.05, unblock.set)
+                await asyncio.wait_for(writer.drain(), 5)
+                assert writer.buffered == 0
+
+    asyncio.run(main())
+    assert (tmp_path / 'a').read_bytes() == b'x' * 100
+
+
+def test_error_raised_by_drain(tmp_path):
+    def fail():
+        raise ValueError('failed')
+
+    async def main():
+        writer = WriteBehind(threads=1, max_buffered=10)
+        with writer.open(str(tmp_path / 'a')) as f:
+            f.when_written(fail)
+            f.write(b'x' * 100)
+        with pytest.raises(ValueError):
+            await asyncio.wait_for(writer.drain(), 5)
+
+        # The thread carries on with other files.
+        with writer.open(str(tmp_path / 'b')) as f:
+            f.write(b'y' * 100)
+        with pytest.raises(ValueError):
+            await writer.aclose()
+
+    asyncio.run(main())
+    assert (tmp_path / 'b').read_bytes() == b'y' * 100
+
+
+def test_resumable_written_behind(tmp_path, monkeypatch, random_files):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(zipinspect, 'RESUMABLE_SIZE', 50_000)
+    make_zip(tmp_path / 'a.zip', random_files)
+
+    async def main():
+        async with open_reader([str(tmp_path / 'a.zip')]) as z:
+            await extract_entries(z, list(z.entries), out_dir='out', segments=2)
+
+    asyncio.run(main())
+    assert sorted(os.listdir(tmp_path / 'out')) == sorted(random_files)
+    for name, data in random_files.items():
+        assert (tmp_path / 'out' / name).read_bytes() == data
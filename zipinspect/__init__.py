@@ -1,16 +1,23 @@
+import argparse
 import asyncio
+import json
 import os.path
+import re
 import sys
 import textwrap
 import time
 
-from tabulate import tabulate
-from progress.bar import Bar
-from aioconsole import ainput
+from contextlib import asynccontextmanager
 
-from .zipread import HTTPZipReader
+# NOTE Readers are imported where archives are opened, httpx along with the HTTP one.
+from .zipread import IndexCache, BlockCache, plan_ranges, group_spans
+from .zipread import dedupe_entries, Manifest
+from .zipread import MIN_SEGMENT_SIZE, ZipError, HTTPError, ZipCompression, ResumeState, entry_identity
+from .zipread.planner import DEFAULT_MAX_GAP
 
-from .utils.asyncio import TaskPool
+from .utils.asyncio import AdaptivePool
+from .utils.writer import WriteBehind
+from .utils.files import clone_file, file_crc32, CLONE_MODES
 from .utils.misc import PaginatedCollection
 
 
@@ -23,14 +30,31 @@ def numfmt_iec(n):
             return f'{n:3.1f}{u}'
         n /= 1024.0
 
-def sanitized_open(path, *args, **kwargs):
+def sanitized_path(path):
     path = os.path.abspath(path)
     if os.path.commonpath((path, os.getcwd())) != os.getcwd():
         print(f"WARNING: Path {path} is dangerous; ignoring")
         return None
 
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    return open(path, *args, **kwargs)
+    return path
+
+def output_path(path, out_dir=None):
+    return f'{out_dir}/{path}' if out_dir else path
+
+@asynccontextmanager
+async def removing_partial(outputs):
+    """Remove the files of `outputs' (see `WriteBehindFile') that aren't written whole, should
+    anything go wrong; preallocated, they'd pass for extracted by their size."""
+    try:
+        yield
+    except BaseException:
+        def remove():
+            for f in outputs:
+                if (not f.completed or f.error is not None) and os.path.isfile(f.name):
+                    os.remove(f.name)
+
+        await asyncio.to_thread(remove)
+        raise
 
 def parse_repl_args(line):
     """Space delimited argument parser like the shell, but minimal."""
@@ -70,69 +94,295 @@ def parse_repl_args(line):
 
     return parsed
 
-async def extract_entries(z, entries, *, out_dir=None, concurrency=10):
-    async def extract_entry(entry, *, progress_cb):
-        final_path = f'{out_dir}/{entry.path}' if out_dir else entry.path
-
-        if not (output := sanitized_open(final_path, 'wb')):
-            return
+def pop_option(args, name):
+    """Remove an option and its value from parsed arguments, and return the value."""
+    if name not in args:
+        return None
 
+    i = args.index(name)
+    value = args[i + 1] if i + 1 < len(args) else None
+    del args[i:i + 2]
+
+    return value
+
+# Bytes of requests in flight at once during extraction, at most.
+DEFAULT_MAX_INFLIGHT = 256 * 1024 * 1024
+# Entries at least this large are extracted resumably, with their progress kept next to them.
+RESUMABLE_SIZE = 16 * 1024 * 1024
+
+async def extract_entries(z, entries, *, out_dir=None, concurrency=None,
+                          max_gap=DEFAULT_MAX_GAP, multipart=True, segments=1,
+                          max_inflight=DEFAULT_MAX_INFLIGHT, resume=True, dedupe='reflink',
+                          verify=False, manifest: Manifest = None):
+    """Extract entries, and the entries in directories among them. Entries with the same
+    contents as another (see `dedupe_entries') are only downloaded once, and made out of
+    that one with `clone_file' in the `dedupe' mode, unless it's None; with `verify', their
+    checksums are checked once made. Entries extracted are recorded in `manifest', if any."""
+    from progress.bar import Bar
+
+    # NOTE Files are written by threads of their own, so that downloads don't wait on the disk.
+    writer = WriteBehind()
+    # Where the selected entries go, keyed by their offsets.
+    paths = {}
+    duplicates = []
+    # NOTE Files extracted resumably aren't among them, as their progress is kept.
+    outputs = []
+
+    def open_output(entry):
+        outputs.append(writer.open(paths[entry.raw_offset], entry.file_size))
+        return outputs[-1]
+
+    def resumable(entry):
+        return resume and entry.compressed_size >= RESUMABLE_SIZE and not entry.encrypted
+
+    async def extract_group(spans, *, progress_cb):
         # NOTE Multiple running async-for loops (i.e. async generators) are cumbersome,
         # and thus to make matters manageable we use the good 'ol callbacks instead.
-        with output:
-            async for processed in z.extract(entry, output):
-                progress_cb(processed)
+        async for processed in z.extract_spans(spans, open_output):
+            progress_cb(processed)
+            await writer.drain()
+
+    async def extract_segmented(entry, *, progress_cb):
+        if not resumable(entry):
+            with open_output(entry) as output:
+                async for processed in z.extract(entry, output, segments=segments):
+                    progress_cb(processed)
+                    await writer.drain()
+            return
 
+        path = paths[entry.raw_offset]
+        writer.makedirs(os.path.dirname(path))
+        compressed = entry.compression != ZipCompression.NONE
+        with ResumeState.open(path, entry_identity(z, entry), spool=compressed) as state, \
+                state.open_output(writer, entry.file_size) as output:
+            # NOTE What an earlier extraction wrote already counts as done, but not as throughput.
+            bar.next(state.done_size)
 
-    async with TaskPool(maxsize=concurrency) as pool:
-        visited_dirs = set()
-        total_tx = 0
-        coros = set()
-        bar = None
+            async for processed in z.extract(entry, output, segments=segments, resume=state):
+                progress_cb(processed)
+                await writer.drain()
+
+    # NOTE Concurrency is tuned while extracting, unless fixed; HTTP/2 caps it in any case.
+    maximum = concurrency or min(z.max_streams or 64, 64)
+    initial = concurrency or min(4, maximum)
+
+    # NOTE By the time the writer is closed, only writes are left to wait for.
+    with z.stats.phase('extract'):
+        async with removing_partial(outputs), writer, \
+                AdaptivePool(initial=initial, minimum=concurrency or 1, maximum=maximum,
+                             max_bytes=max_inflight) as pool:
+            visited_dirs = set()
+            selected = {}
+            bar = None
+
+            # Non-obvious control flow: by the time this function is called, `bar' would've been defined.
+            # This style of programming -- relying on global state -- is considered bad practice, but here
+            # this saves us the burden of not introducing one more asyncio.Task in the task pool.
+            def increment_done(n):
+                bar.next(n)
+                pool.record(n)
+
+            for info in entries:
+                if info.is_dir:
+                    # Recursing into directories
+                    if info.path not in visited_dirs:
+                        visited_dirs.add(info.path)
+
+                        index = await z.path_index()
+                        for i in index.subtree(info.path):
+                            nested_info = z.entries[i]
+                            if not nested_info.is_dir:
+                                selected[nested_info.raw_offset] = nested_info
+
+                else: # Single files
+                    if os.path.dirname(info.path) not in visited_dirs:
+                        selected[info.raw_offset] = info
+
+            for offset, info in list(selected.items()):
+                if path := sanitized_path(output_path(info.path, out_dir)):
+                    paths[offset] = path
+                else:
+                    del selected[offset]
+
+            # NOTE Records of files about to be overwritten can't be trusted until they're
+            # extracted again, should that be cut short.
+            if manifest is not None:
+                for info in selected.values():
+                    manifest.forget(info.path)
+                await asyncio.to_thread(manifest.save)
+
+            unique = selected.values()
+            if dedupe:
+                unique, duplicates = dedupe_entries(unique)
+
+            total_tx = sum(info.file_size for info in unique)
+
+            # Large entries are downloaded by themselves, in segments if asked to, and resumably.
+            large, rest = [], []
+            for info in unique:
+                if resumable(info) or segments > 1 and info.compressed_size >= 2 * MIN_SEGMENT_SIZE:
+                    large.append(info)
+                else:
+                    rest.append(info)
+
+            # Neighbouring entries are fetched together, and small spans are further batched
+            # into multi-range requests, so that a batch of small files isn't bound by round trips.
+            spans = plan_ranges(rest, max_gap=max_gap, limit=z.size)
+            groups = group_spans(spans) if multipart else [[span] for span in spans]
+
+            # The largest work starts first, so that it doesn't end up running alone at the end.
+            large.sort(key=lambda info: info.compressed_size, reverse=True)
+            groups.sort(key=lambda group: sum(span.size for span in group), reverse=True)
+
+            bar = Bar(max=total_tx, width=80, suffix='%(percent)d%%')
+            for info in large:
+                pool.create_task(extract_segmented(info, progress_cb=increment_done),
+                                 size=info.compressed_size)
+            for group in groups:
+                pool.create_task(extract_group(group, progress_cb=increment_done),
+                                 size=sum(span.size for span in group))
+            bar.finish()
+
+    def clone_duplicates():
+        for info, original in duplicates:
+            # NOTE Entries may well share a path, the last one extracted winning.
+            if (path := paths[info.raw_offset]) != paths[original.raw_offset]:
+                clone_file(paths[original.raw_offset], path, dedupe)
+
+            if verify and (crc := file_crc32(path)) != info.checksum:
+                raise ZipError(f"CRC mismatch for {info.path}: "
+                               f"expected {info.checksum:08x}, got {crc:08x}")
+
+    # NOTE Duplicates are made out of the files extracted, so only once they're all written.
+    if duplicates:
+        await asyncio.to_thread(clone_duplicates)
+
+    if manifest is not None:
+        for info in selected.values():
+            manifest.record(info)
+
+async def sync_entries(z, entries, *, out_dir=None, delete=False, **kwargs):
+    """Extract only those of `entries' that aren't already in `out_dir' as they are now, going
+    by its `Manifest', which is brought up to date. With `delete', files extracted there before
+    whose entries are no longer in the archive are removed."""
+    manifest = Manifest.load(out_dir or '.')
+
+    # NOTE Files that aren't recorded are checksummed, which is best kept off the event loop.
+    changed = await asyncio.to_thread(lambda: [info for info in entries
+                                               if not manifest.unchanged(info, output_path(info.path, out_dir))])
+    for info in entries:
+        manifest.record(info)
 
-        # Non-obvious control flow: by the time this function is called, `bar' would've been defined.
-        # This style of programming -- relying on global state -- is considered bad practice, but here
-        # this saves us the burden of not introducing one more asyncio.Task in the task pool.
-        def increment_done(n):
-            bar.next(n)
+    try:
+        await extract_entries(z, changed, out_dir=out_dir, manifest=manifest, **kwargs)
+    except BaseException:
+        # NOTE Whichever of them did get extracted is told by its checksum next time.
+        for info in changed:
+            manifest.forget(info.path)
+        manifest.save()
+        raise
 
-        for info in entries:
-            if info.is_dir:
-                # Recursing into directories
-                if info.path not in visited_dirs:
-                    visited_dirs.add(info.path)
+    removed = []
+    if delete:
+        # NOTE Entries that weren't selected this time are still in the archive, and kept.
+        await z.wait_loaded()
+        current = set(map(z.entries.path, range(len(z.entries))))
+        removed = [path for path in manifest.files if path not in current]
 
-                    for nested_info in z.entries:
-                        if (not nested_info.is_dir and
-                                nested_info.path.startswith(info.path)):
-                            coros.add(extract_entry(nested_info, progress_cb=increment_done))
-                            total_tx += nested_info.file_size
+        for path in removed:
+            manifest.forget(path)
+            if (target := sanitized_path(output_path(path, out_dir))) and os.path.isfile(target):
+                os.remove(target)
 
-            else: # Single files
-                if os.path.dirname(info.path) not in visited_dirs:
-                    coros.add(extract_entry(info, progress_cb=increment_done))
-                    total_tx += info.file_size
+    manifest.save()
+    print(f"{len(changed)} of {len(entries)} entries extracted, {len(removed)} removed", file=sys.stderr)
 
-        bar = Bar(max=total_tx, width=80, suffix='%(percent)d%%')
-        for coro in coros:
-            pool.create_task(coro)
-        bar.finish()
 
+def zipinfo_to_row(info):
+    size = numfmt_iec(info.file_size) \
+        if not info.is_dir else 'N/A'
+    timestamp = dostime_to_rfc3339(info.modified_date)
 
-def print_entries(pages):
-    def zipinfo_to_row(info):
-        size = numfmt_iec(info.file_size) \
-            if not info.is_dir else 'N/A'
-        timestamp = dostime_to_rfc3339(info.modified_date)
+    return info.path, size, timestamp
 
-        return info.path, size, timestamp
+async def print_entries(z, pages):
+    from tabulate import tabulate
+
+    await z.wait_entries(pages.current_offset + pages.page_size)
 
     page = [(i, *zipinfo_to_row(info))
             for i, info in enumerate(pages.current(),
                                      start=pages.current_offset)]
 
     print(tabulate(page, headers=['#', 'entry', 'size', 'modified date']))
-    print(f"(Page {pages.current_page + 1}/{pages.n_pages})")
+    if z.loaded:
+        print(f"(Page {pages.current_page + 1}/{pages.n_pages})")
+    else:
+        print(f"(Page {pages.current_page + 1}/{pages.n_pages}; "
+              f"loaded {len(z.entries)} of {z.n_entries} entries)")
+
+async def print_children(z, cwd):
+    from tabulate import tabulate
+
+    index = await z.path_index()
+    rows = []
+
+    for name in index.children(cwd):
+        i = index.lookup(cwd + name)
+        if name.endswith('/'):
+            rows.append((i if i is not None else '', name, 'N/A', ''))
+        else:
+            info = z.entries[i]
+            rows.append((i, name, numfmt_iec(info.file_size), dostime_to_rfc3339(info.modified_date)))
+
+    print(tabulate(rows, headers=['#', 'entry', 'size', 'modified date']))
+
+def print_stats(z):
+    from tabulate import tabulate
+
+    stats = z.stats
+    rows = [
+        ('elapsed', f'{stats.to_dict()["elapsed"]:.1f}s'),
+        ('requests', ', '.join(f'{n} {kind}' for kind, n in stats.requests.items()) or '0'),
+        ('received', numfmt_iec(stats.bytes_received)),
+        ('entries extracted', f'{stats.entry_count} ({numfmt_iec(stats.entry_bytes)} compressed)'),
+    ]
+    if stats.overfetch is not None:
+        rows.append(('over-fetch', f'{stats.overfetch:.2f}x'))
+    # NOTE Only archives over HTTP have a block cache.
+    if (blocks := getattr(z, 'blocks', None)) is not None:
+        rows.append(('block cache', f'{blocks.hits} hits, {blocks.misses} misses, '
+                                    f'{numfmt_iec(blocks.size)} held'))
+
+    print(tabulate(rows, tablefmt='plain'))
+    print()
+    print(tabulate([(name, count, f'{seconds:.3f}s') for name, (count, seconds) in stats.phases.items()],
+                   headers=['phase', 'count', 'time']))
+
+def resolve_dir(cwd, path):
+    """Resolve a directory against the current one, inside the archive."""
+    if path.startswith('/'):
+        parts = []
+    else:
+        parts = cwd.rstrip('/').split('/') if cwd else []
+
+    for part in path.split('/'):
+        if part == '..':
+            if parts:
+                parts.pop()
+        elif part and part != '.':
+            parts.append(part)
+
+    return ''.join(f'{part}/' for part in parts)
+
+def is_glob(s):
+    return any(c in s for c in '*?[')
+
+def parse_date(v):
+    try:
+        return time.strptime(v, '%Y-%m-%d')[:6]
+    except ValueError:
+        print(f"ERROR: {v!r} is not a date like YYYY-MM-DD", file=sys.stderr)
 
 def int_safe(v, *args, **kwargs):
     try:
@@ -147,16 +397,39 @@ def int_safe(v, *args, **kwargs):
 
     return iv
 
-async def app(url):
-    async with HTTPZipReader(url) as z:
-        pages = PaginatedCollection(z.entries)
+def open_reader(urls, *, blocks=None, **kwargs):
+    """Reader of the archive at the first of `urls', with the rest as mirrors; anything but
+    a URL is a local file, which is read directly."""
+    if '://' not in urls[0]:
+        from .zipread import SourceZipReader, FileRangeSource
+        return SourceZipReader(FileRangeSource(urls[0]), **kwargs)
+
+    from .zipread.httpreader import HTTPZipReader
+    return HTTPZipReader(urls, blocks=blocks, **kwargs)
+
+async def app(urls):
+    from tabulate import tabulate
+    from aioconsole import ainput
+
+    # NOTE Entries are loaded in the background, so that the first page is available while
+    # the rest of the central directory is still streaming in.
+    # NOTE Blocks are kept for the session, so that extracting the same entries again doesn't
+    # download them again.
+    async with open_reader(urls, cache=IndexCache(), blocks=BlockCache(), background=True) as z:
+        pages = PaginatedCollection(z.entries, length=z.n_entries)
+        # Current directory inside the archive, for `cd', `ls', `find' and globs.
+        cwd = ''
+        # State of the REPL in the archives containing the current one, if it was entered.
+        nested = []
 
         while True:
             try:
-                args = parse_repl_args(await ainput("> "))
+                args = parse_repl_args(await ainput(f"{z.info.path}> " if nested else "> "))
             except EOFError:
                 break
 
+            z.check_loaded()
+
             # Skip empty prompts.
             if len(args) < 1:
                 continue
@@ -172,18 +445,111 @@ async def app(url):
                           extract <index> [dir]           Extract entry with index <index>
                           extract <start>,...,<end> [dir] Extract entries from <start> to <end>
                           extract <i0>,<i1>,...<in> [dir] Extract entries with specified indices
+                          extract <glob> [dir]            Extract entries matching a glob pattern
+                          ls [dir]                        List entries in a directory of the archive
+                          cd <dir>                        Change the current directory in the archive
+                          find <pattern>                  Find entries matching a glob pattern
+                          enter <index>                   Browse an entry that is a Zip file itself
+                          leave                           Go back to the containing archive
+                          stats [file]                    Show transfer statistics, or save them as JSON
                           
                           NOTE: The extract command accepts an optinal path to the directory to extract into.
-                          If not provided, it extracts into the current working directory"""))
+                          If not provided, it extracts into the current working directory. With the option
+                          --segments <n>, large entries are downloaded in <n> parts concurrently.
+
+                          Patterns are relative to the current directory in the archive, unless they begin
+                          with a slash. The find command also accepts --regex to take a regular expression
+                          instead, --min-size <n> and --max-size <n> in bytes, and --after <date> and
+                          --before <date> as YYYY-MM-DD."""))
                 case 'list':
-                    print_entries(pages)
+                    await print_entries(z, pages)
                 case 'prev':
                     pages.previous()
-                    print_entries(pages)
+                    await print_entries(z, pages)
                 case 'next':
                     pages.next()
-                    print_entries(pages)
+                    await print_entries(z, pages)
+                case 'ls':
+                    path = resolve_dir(cwd, args[1]) if len(args) > 1 else cwd
+                    if not (await z.path_index()).is_dir(path):
+                        print(f"ERROR: No such directory {path!r}", file=sys.stderr)
+                        continue
+
+                    await print_children(z, path)
+                case 'enter':
+                    if len(args) < 2:
+                        print("ERROR: Nothing to enter, forgot an argument?", file=sys.stderr)
+                        continue
+
+                    if (i := int_safe(args[1])) is None:
+                        continue
+                    if not 0 <= i < len(z.entries):
+                        print(f"ERROR: Index {i} is out of bounds", file=sys.stderr)
+                        continue
+
+                    try:
+                        child = await z.open_archive(z.entries[i]).__aenter__()
+                    except ZipError as e:
+                        print(f"ERROR: {z.entries[i].path} is not a Zip file; {e}", file=sys.stderr)
+                        continue
+
+                    nested.append((z, pages, cwd))
+                    z = child
+                    pages = PaginatedCollection(z.entries, length=z.n_entries)
+                    cwd = ''
+                case 'leave':
+                    if not nested:
+                        print("ERROR: Not inside a nested archive", file=sys.stderr)
+                        continue
+
+                    await z.__aexit__(None, None, None)
+                    z, pages, cwd = nested.pop()
+                case 'stats':
+                    if len(args) > 1:
+                        z.stats.dump(args[1])
+                    else:
+                        print_stats(z)
+                case 'cd':
+                    path = resolve_dir(cwd, args[1] if len(args) > 1 else '/')
+                    if not (await z.path_index()).is_dir(path):
+                        print(f"ERROR: No such directory {path!r}", file=sys.stderr)
+                        continue
+
+                    cwd = path
+                case 'find':
+                    regex = '--regex' in args
+                    if regex:
+                        args.remove('--regex')
+
+                    filters = {}
+                    for option, key, parse in (('--min-size', 'min_size', int_safe),
+                                               ('--max-size', 'max_size', int_safe),
+                                               ('--after', 'after', parse_date),
+                                               ('--before', 'before', parse_date)):
+                        if (value := pop_option(args, option)) is not None:
+                            if (value := parse(value)) is None:
+                                break
+                            filters[key] = value
+                    else:
+                        pattern = args[1] if len(args) > 1 else None
+                        if pattern is not None and not regex:
+                            pattern = pattern[1:] if pattern.startswith('/') else cwd + pattern
+
+                        try:
+                            found = list((await z.path_index()).find(pattern, regex=regex, **filters))
+                        except re.error as e:
+                            print(f"ERROR: Invalid regular expression: {e}", file=sys.stderr)
+                            continue
+
+                        print(tabulate([(i, *zipinfo_to_row(z.entries[i])) for i in found],
+                                       headers=['#', 'entry', 'size', 'modified date']))
+                        print(f"({len(found)} entries found)")
                 case 'extract':
+                    segments = 1
+                    if (value := pop_option(args, '--segments')) is not None:
+                        if (segments := int_safe(value)) is None:
+                            continue
+
                     if len(args) < 2:
                         print("ERROR: Nothing to extract, forgot an argument?", file=sys.stderr)
                         continue
@@ -194,7 +560,16 @@ async def app(url):
                     if len(args) > 2:
                         out_dir = args[2]
 
-                    if len(indices) == 1:
+                    if is_glob(args[1]):
+                        pattern = args[1][1:] if args[1].startswith('/') else cwd + args[1]
+                        entries = [z.entries[i] for i in (await z.path_index()).find(pattern)]
+
+                        if not entries:
+                            print(f"ERROR: Nothing matches {args[1]!r}", file=sys.stderr)
+                            continue
+
+                        await extract_entries(z, entries, out_dir=out_dir, segments=segments)
+                    elif len(indices) == 1:
                         start = int_safe(indices[0])
                         if start is None:
                             continue
@@ -203,7 +578,7 @@ async def app(url):
                             print(f"ERROR: Index {start} is out of bounds", file=sys.stderr)
                             continue
 
-                        await extract_entries(z, (z.entries[start],), out_dir=out_dir)
+                        await extract_entries(z, (z.entries[start],), out_dir=out_dir, segments=segments)
                     else:
                         if len(indices) == 3 and indices[1] == '...':
                             start, end = int_safe(indices[0]), int_safe(indices[2])
@@ -214,20 +589,270 @@ async def app(url):
                                 print(f"ERROR: Range {start},...,{end} is out of bounds", file=sys.stderr)
                                 continue
 
-                            await extract_entries(z, z.entries[start:end], out_dir=out_dir)
+                            await extract_entries(z, z.entries[start:end], out_dir=out_dir, segments=segments)
                         else:
                             # Filter out invalid and out-of-bounds indices
                             entries = [z.entries[iv] for s in indices
                                                      if (iv := int_safe(s)) is not None and 0 <= iv < len(z.entries)]
-                            await extract_entries(z, entries, out_dir=out_dir)
+                            await extract_entries(z, entries, out_dir=out_dir, segments=segments)
 
                     # FIXME For some reason, Bar.finish() doesn't end with a newline.
                     sys.stdout.write('\n\n')
                 case wrong_cmd:
                     print(f"ERROR: Not a valid command {wrong_cmd}; try again.", file=sys.stderr)
 
+        while nested:
+            await z.__aexit__(None, None, None)
+            z, pages, cwd = nested.pop()
+
+def entry_to_dict(i, info):
+    return {'index': i, 'path': info.path, 'size': info.file_size,
+            'compressed_size': info.compressed_size, 'modified': dostime_to_rfc3339(info.modified_date),
+            'method': info.compression.name.lower(), 'crc32': f'{info.checksum:08x}'}
+
+async def iter_indices(z, pattern=None):
+    """Indices of entries matching a glob pattern, or of all of them as they're loaded."""
+    if pattern is not None:
+        for i in (await z.path_index()).find(pattern):
+            yield i
+        return
+
+    done = 0
+    while True:
+        await z.wait_entries(done + 1)
+        if done >= (loaded := len(z.entries)):
+            break
+
+        for i in range(done, loaded):
+            yield i
+        done = loaded
+
+    z.check_loaded()
+
+async def list_entries(z, *, pattern=None, as_json=False):
+    """Print entries one per line, as soon as they're loaded; as JSON objects with `as_json'."""
+    async for i in iter_indices(z, pattern):
+        info = z.entries[i]
+        if as_json:
+            print(json.dumps(entry_to_dict(i, info), ensure_ascii=False))
+        else:
+            path, size, timestamp = zipinfo_to_row(info)
+            print(f'{size:>8}  {timestamp}  {path}')
+
+async def select_entries(z, paths, patterns, *, dirs=False):
+    """Entries by path (directories standing for everything under them) and by glob pattern;
+    all of them if neither is given. Entries of directories themselves are left out, unless
+    `dirs' is set."""
+    index = await z.path_index()
+    if not paths and not patterns:
+        return [info for info in z.entries if dirs or not info.is_dir]
+
+    selected = {}
+    for path in paths:
+        if (i := index.lookup(path)) is not None and not z.entries[i].is_dir:
+            selected[i] = z.entries[i]
+        elif index.is_dir(path.rstrip('/')):
+            selected.update((j, z.entries[j]) for j in index.subtree(path.rstrip('/') + '/'))
+        else:
+            raise ZipError(f"No such entry {path!r}")
+
+    for pattern in patterns:
+        selected.update((i, z.entries[i]) for i in index.find(pattern))
+
+    return [info for info in selected.values() if dirs or not info.is_dir]
+
+async def write_entry(z, path, output):
+    """Write a single entry to a stream, e.g. stdout."""
+    i = (await z.path_index()).lookup(path)
+    if i is None or z.entries[i].is_dir:
+        raise ZipError(f"No such file {path!r}")
+
+    async for _ in z.extract(z.entries[i], output):
+        pass
+    output.flush()
+
+async def repack_entries(z, entries, path):
+    """Copy entries into a new Zip file as they are, compressed."""
+    from progress.bar import Bar
+
+    bar = Bar(max=sum(info.compressed_size for info in entries), width=80, suffix='%(percent)d%%')
+    with open(path, 'wb') as f:
+        async for processed in z.repack(entries, f):
+            bar.next(processed)
+    bar.finish()
+
+async def index_archives(urls, *, concurrency, per_host):
+    """Print the entries of many archives, as a JSON object per archive and line, as soon
+    as each is loaded; returns whether all of them were."""
+    from .zipread.pool import ArchivePool
+
+    ok = True
+    async with ArchivePool(concurrency=concurrency, per_host=per_host, cache=IndexCache()) as pool:
+        async for listing in pool.list(urls):
+            if listing.error is not None:
+                ok = False
+                line = {'url': listing.url, 'error': str(listing.error) or type(listing.error).__name__}
+            else:
+                line = {'url': listing.url, 'size': listing.size,
+                        'entries': [entry_to_dict(i, info) for i, info in enumerate(listing.entries)]}
+
+            print(json.dumps(line, ensure_ascii=False))
+
+    return ok
+
+def read_urls(args):
+    yield from args.urls
+    if args.input:
+        with open(args.input) if args.input != '-' else sys.stdin as f:
+            for line in f:
+                if url := line.strip():
+                    yield url
+
+async def run(args):
+    if args.command == 'repl':
+        await app(args.urls)
+        return 0
+    if args.command == 'index':
+        ok = await index_archives(read_urls(args), concurrency=args.jobs, per_host=args.per_host)
+        return 0 if ok else 1
+
+    # NOTE Listings are printed while the central directory is still streaming in.
+    async with open_reader([args.url, *args.mirror], cache=IndexCache(),
+                           background=args.command == 'ls') as z:
+        match args.command:
+            case 'ls':
+                await list_entries(z, pattern=args.glob, as_json=args.json)
+            case 'cat':
+                await write_entry(z, args.path, sys.stdout.buffer)
+            case 'extract' | 'sync':
+                entries = await select_entries(z, args.paths, args.glob)
+                options = dict(out_dir=args.out_dir, concurrency=args.jobs, segments=args.segments,
+                               resume=not args.no_resume, verify=args.verify,
+                               dedupe=args.dedupe if args.dedupe != 'off' else None)
+
+                if args.command == 'sync':
+                    await sync_entries(z, entries, delete=args.delete, **options)
+                else:
+                    # NOTE What's extracted into a directory of its own is recorded, for later syncs.
+                    manifest = Manifest.load(args.out_dir) if args.out_dir else None
+                    await extract_entries(z, entries, manifest=manifest, **options)
+                    if manifest is not None:
+                        manifest.save()
+
+                if sys.stderr.isatty():
+                    sys.stderr.write('\n')
+            case 'repack':
+                entries = await select_entries(z, args.paths, args.glob, dirs=True)
+                await repack_entries(z, entries, args.output)
+
+    return 0
+
+class HelpFormatter(argparse.HelpFormatter):
+    """Same as argparse's, but for telling the width of the terminal without shutil, which
+    imports every compression module there is."""
+
+    def __init__(self, prog, **kwargs):
+        if 'width' not in kwargs:
+            try:
+                columns = int(os.environ['COLUMNS'])
+            except (KeyError, ValueError):
+                try:
+                    columns = os.get_terminal_size(sys.__stdout__.fileno()).columns
+                except (AttributeError, ValueError, OSError):
+                    columns = 80
+            kwargs['width'] = columns - 2
+
+        super().__init__(prog, **kwargs)
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog='zipinspect', description="Inspect and extract Zip files over HTTP",
+                                     formatter_class=HelpFormatter)
+    parser.add_argument('--debug', action='store_true', help="run the event loop in debug mode")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    repl = commands.add_parser('repl', help="browse an archive interactively (the default)",
+                               formatter_class=HelpFormatter)
+    repl.add_argument('urls', nargs='+', metavar='url', help="URL of the archive, and of any mirrors of it")
+
+    def add_command(name, help):
+        command = commands.add_parser(name, help=help, formatter_class=HelpFormatter)
+        command.add_argument('url', help="URL of the archive, or path of a local one")
+        command.add_argument('--mirror', action='append', default=[], help="URL of a mirror of the archive")
+        return command
+
+    ls = add_command('ls', "list entries, one per line")
+    ls.add_argument('--glob', help="only entries matching a pattern")
+    ls.add_argument('--json', action='store_true', help="print entries as JSON objects")
+
+    def add_extract_command(name, help):
+        command = add_command(name, help)
+        command.add_argument('paths', nargs='*', help="entries or directories; everything if none (and no --glob)")
+        command.add_argument('--glob', action='append', default=[], help="entries matching a pattern")
+        command.add_argument('-o', '--out-dir', help="directory to extract into")
+        command.add_argument('-j', '--jobs', type=int, help="concurrent requests; tuned while running if not given")
+        command.add_argument('--segments', type=int, default=1, help="parts to download large entries in")
+        command.add_argument('--no-resume', action='store_true', help="start interrupted extractions over")
+        command.add_argument('--dedupe', choices=(*CLONE_MODES, 'off'), default='reflink',
+                             help="how entries with the same contents as another are made out of it, "
+                                  "instead of downloading them again")
+        command.add_argument('--verify', action='store_true', help="check the checksums of entries made that way")
+        return command
+
+    add_extract_command('extract', "extract entries")
+
+    sync = add_extract_command('sync', "extract only the entries that changed since they last were")
+    sync.add_argument('--delete', action='store_true', help="remove files of entries that are gone")
+
+    cat = add_command('cat', "write an entry to stdout")
+    cat.add_argument('path')
+
+    index = commands.add_parser('index', help="list many archives at once, as a JSON object per line",
+                                formatter_class=HelpFormatter)
+    index.add_argument('urls', nargs='*', metavar='url')
+    index.add_argument('-i', '--input', help="file with URLs, one per line; - for stdin")
+    index.add_argument('-j', '--jobs', type=int, default=64, help="archives loaded at once")
+    index.add_argument('--per-host', type=int, default=8, help="archives loaded at once from the same host")
+
+    repack = add_command('repack', "copy entries into a new Zip file, without recompressing them")
+    repack.add_argument('output', help="path of the new Zip file")
+    repack.add_argument('paths', nargs='*', help="entries or directories; everything if none (and no --glob)")
+    repack.add_argument('--glob', action='append', default=[], help="entries matching a pattern")
+
+    return parser
+
+def http_errors():
+    """Errors of httpx, if it was imported at all, i.e. if any URL was opened."""
+    httpx = sys.modules.get('httpx')
+    return (httpx.HTTPError,) if httpx else ()
+
 def main():
-    if len(sys.argv) < 2:
+    parser = make_parser()
+    argv = sys.argv[1:]
+    if not argv:
+        parser.print_usage(sys.stderr)
         print("Forgot thy URL?", file=sys.stderr)
+        sys.exit(2)
+    # NOTE For compatibility, URLs by themselves start the REPL; further URLs are taken as
+    # mirrors of the first.
+    elif argv[0] not in ('repl', 'ls', 'extract', 'sync', 'cat', 'index', 'repack') and not argv[0].startswith('-'):
+        argv.insert(0, 'repl')
+
+    # NOTE Paths to extract may come after options too, which subcommands don't allow for.
+    args, rest = parser.parse_known_args(argv)
+    if rest and args.command in ('extract', 'sync', 'repack') and not any(arg.startswith('-') for arg in rest):
+        args.paths += rest
+    elif rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
 
-    asyncio.run(app(sys.argv[1]), debug=True)
+    try:
+        # NOTE Debug mode slows down every iteration of the event loop, so it's off unless asked for
+        # (or PYTHONASYNCIODEBUG is set).
+        sys.exit(asyncio.run(run(args), debug=True if args.debug else None))
+    except (ZipError, HTTPError, *http_errors(), OSError) as e:
+        if isinstance(e, BrokenPipeError):
+            # Whoever reads the output stopped doing so, e.g. `head'.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
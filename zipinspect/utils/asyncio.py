@@ -1,4 +1,20 @@
-from asyncio import TaskGroup, Semaphore
+from asyncio import (
+    TaskGroup,
+    Semaphore,
+    Event,
+    FIRST_COMPLETED,
+    ensure_future,
+    gather,
+    wait,
+    get_running_loop
+)
+
+# Throughput has to improve by this fraction for the concurrency to be raised further.
+GAIN_THRESHOLD = 0.05
+# Throughput falling below this fraction of the best seen is taken as congestion.
+DROP_THRESHOLD = 0.6
+# The best throughput seen is forgotten slowly, so that more concurrency gets tried again.
+BEST_DECAY = 0.95
 
 class TaskPool(TaskGroup):
     def __init__(self, *, maxsize):
@@ -17,3 +33,103 @@ class TaskPool(TaskGroup):
 
         return super().create_task(wrapper_coro(), **kwargs)
 
+
+class AdaptivePool(TaskGroup):
+    """Task group whose limit of concurrent tasks is tuned while running, AIMD-style, from
+    the throughput reported through `record()'. The limit grows by one as long as throughput
+    improves with it, and is halved when throughput collapses. Tasks also declare a size, and
+    no more than `max_bytes' of them are in flight altogether, unless a task is alone."""
+
+    def __init__(self, *, initial=4, minimum=1, maximum=64, max_bytes=None, interval=0.5):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.running = 0
+        self.inflight = 0
+        self._changed = Event()
+        self._transferred = 0
+        self._window_start = None
+        self._best = 0.0
+        super().__init__()
+
+    def _admits(self, size):
+        if self.running >= self.limit:
+            return False
+
+        return not self.running or self.max_bytes is None or self.inflight + size <= self.max_bytes
+
+    def create_task(self, coro, *, size=0, **kwargs):
+        async def wrapper_coro():
+            while not self._admits(size):
+                self._changed.clear()
+                await self._changed.wait()
+
+            self.running += 1
+            self.inflight += size
+            try:
+                return await coro
+            finally:
+                self.running -= 1
+                self.inflight -= size
+                self._changed.set()
+
+        return super().create_task(wrapper_coro(), **kwargs)
+
+    def record(self, n):
+        """Account for `n' bytes transferred by the tasks."""
+        now = get_running_loop().time()
+        if self._window_start is None:
+            self._window_start = now
+
+        self._transferred += n
+        if (elapsed := now - self._window_start) >= self.interval:
+            self._tune(self._transferred / elapsed)
+            self._transferred = 0
+            self._window_start = now
+
+    def _tune(self, throughput):
+        # NOTE Only a limit that is actually reached says anything about concurrency; otherwise
+        # there's just not enough work left.
+        if self.running < self.limit:
+            return
+
+        if throughput > self._best * (1 + GAIN_THRESHOLD):
+            self._best = throughput
+            self.limit = min(self.limit + 1, self.maximum)
+            self._changed.set()
+        elif throughput < self._best * DROP_THRESHOLD:
+            self._best = throughput
+            self.limit = max(self.limit // 2, self.minimum)
+        else:
+            self._best *= BEST_DECAY
+
+
+async def drain_queue(queue, tasks):
+    """Yield items put on `queue' by `tasks' until all of them finish. If any of them
+    fails, the rest are cancelled and the error is raised."""
+    pending = set(tasks)
+
+    try:
+        while pending or not queue.empty():
+            if not queue.empty():
+                yield queue.get_nowait()
+                continue
+
+            getter = ensure_future(queue.get())
+            done, _ = await wait(pending | {getter}, return_when=FIRST_COMPLETED)
+
+            if getter in done:
+                yield getter.result()
+            else:
+                # NOTE Cancelling a getter never loses an item; it stays in the queue.
+                getter.cancel()
+
+            for task in done - {getter}:
+                pending.discard(task)
+                task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        await gather(*pending, return_exceptions=True)
@@ -0,0 +1,49 @@
+import os
+import zlib
+
+# Linux's ioctl for a file to share the blocks of another, on filesystems that can.
+FICLONE = 0x40049409
+CLONE_MODES = ('reflink', 'hardlink', 'copy')
+# Files are read back in chunks of this size to be checksummed.
+CRC_CHUNK_SIZE = 1024 * 1024
+
+
+def clone_file(src, dst, mode='reflink'):
+    """Make `dst' a file with the contents of `src': a copy sharing its blocks (reflink), a
+    hard link, or a plain copy. If it can't be linked as asked, it's copied instead."""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+
+    if mode == 'hardlink':
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass  # e.g. on another filesystem.
+    elif mode == 'reflink':
+        try:
+            import fcntl
+
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return
+        except (ImportError, OSError):
+            pass  # Not Linux, or not supported by the filesystem.
+
+    # NOTE shutil imports every compression module there is, so it's only imported if need be.
+    import shutil
+    shutil.copyfile(src, dst)
+
+
+def file_crc32(path, start=0, end=None):
+    """CRC-32 of a file, or of the range of it from `start' to `end'."""
+    crc = 0
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = (end if end is not None else os.fstat(f.fileno()).st_size) - start
+        while remaining > 0 and (chunk := f.read(min(CRC_CHUNK_SIZE, remaining))):
+            crc = zlib.crc32(chunk, crc)
+            remaining -= len(chunk)
+
+    return crc
@@ -1,9 +1,15 @@
 class PaginatedCollection:
-    def __init__(self, sequence, *, page_size = 25):
+    def __init__(self, sequence, *, page_size = 25, length = None):
         self.sequence = sequence
         self.current_page = 0
-        self.n_pages = len(sequence) // page_size + 1
         self.page_size = page_size
+        # The sequence may still be growing towards `length'.
+        self.length = length
+
+    @property
+    def n_pages(self):
+        length = self.length if self.length is not None else len(self.sequence)
+        return length // self.page_size + 1
 
     def previous(self):
         if self.current_page == 0:
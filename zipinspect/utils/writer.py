@@ -0,0 +1,230 @@
+import os
+import io
+import queue
+import asyncio
+import threading
+
+DEFAULT_THREADS = 4
+# Bytes handed over to the writers and not written yet, at most; beyond that, `drain' waits
+# for them to catch up.
+DEFAULT_MAX_BUFFERED = 64 * 1024 * 1024
+# Files smaller than this aren't worth a system call to preallocate.
+MIN_PREALLOCATE_SIZE = 1024 * 1024
+
+_OPEN, _WRITE, _CALL, _CLOSE = 'open', 'write', 'call', 'close'
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class WriteBehindFile:
+    """A file being written by a `WriteBehind'; writes return as soon as they're queued.
+    Errors of the writer are raised by the next call, if not by `WriteBehind.close'."""
+
+    def __init__(self, writer, path, queue):
+        self.name = path
+        self.pos = 0
+        self.error = None
+        # Whether it was closed by its context manager without an error, i.e. written whole.
+        self.completed = False
+        self._writer = writer
+        self._queue = queue
+
+    def _check(self):
+        if self.error is not None:
+            raise self.error
+
+    def write(self, data):
+        self._check()
+        if data:
+            self._writer._reserve(len(data))
+            self._queue.put((_WRITE, self, self.pos, data))
+            self.pos += len(data)
+
+        return len(data)
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        match whence:
+            case io.SEEK_SET:
+                self.pos = offset
+            case io.SEEK_CUR:
+                self.pos += offset
+            case _:
+                raise ValueError(f"Unsupported whence {whence}")
+
+        return self.pos
+
+    def flush(self):
+        self._check()
+
+    def when_written(self, fn):
+        """Have `fn' called by the writer, once everything written so far is."""
+        self._check()
+        self._queue.put((_CALL, self, None, fn))
+
+    def close(self):
+        self._queue.put((_CLOSE, self, None, None))
+
+    async def aclose(self):
+        """Same as `close', in a worker thread, so as not to block the event loop."""
+        await asyncio.to_thread(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+
+class WriteBehind:
+    """Writes files in threads of its own, so that whoever produces the data (the event
+    loop, above all) never waits on a slow disk. Writes never block; producers are to await
+    `drain' every so often instead, which waits once `max_buffered' bytes are behind, and
+    raises the first error of the writers, if any.
+
+    Each file is written by one of the threads, in order; files are preallocated to their
+    size if it's given, and directories created once. Buffers are written as they're handed
+    over, not copied."""
+
+    def __init__(self, *, threads=DEFAULT_THREADS, max_buffered=DEFAULT_MAX_BUFFERED):
+        self.max_buffered = max_buffered
+        self.buffered = 0
+        self._lock = threading.Lock()
+        self._waiters = []
+        self._queues = [queue.SimpleQueue() for _ in range(threads)]
+        self._next = 0
+        self._dirs = set()
+        self._dirs_lock = threading.Lock()
+        self._fds = {}
+        self._errors = []
+        self._threads = [threading.Thread(target=self._work, args=(q,), daemon=True) for q in self._queues]
+        for thread in self._threads:
+            thread.start()
+
+    def makedirs(self, path):
+        """Create a directory and its parents, unless it was already."""
+        with self._dirs_lock:
+            if path in self._dirs:
+                return
+        os.makedirs(path, exist_ok=True)
+        with self._dirs_lock:
+            self._dirs.add(path)
+
+    def open(self, path, size=None, *, truncate=True, beside: WriteBehindFile = None):
+        """Open a file for writing; `size' is what it's going to be, if known. Without
+        `truncate', what's in the file already is kept. A file opened `beside' another one
+        is written by the same thread, in order with it."""
+        if beside is not None:
+            q = beside._queue
+        else:
+            q = self._queues[self._next]
+            self._next = (self._next + 1) % len(self._queues)
+
+        f = WriteBehindFile(self, path, q)
+        q.put((_OPEN, f, size, truncate))
+        return f
+
+    async def drain(self):
+        """Wait until no more than `max_buffered' bytes are left to be written."""
+        while True:
+            if self._errors:
+                raise self._errors[0]
+
+            with self._lock:
+                if self.buffered <= self.max_buffered:
+                    return
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+
+            await waiter
+
+    def _reserve(self, n):
+        with self._lock:
+            self.buffered += n
+
+    def _release(self, n):
+        with self._lock:
+            self.buffered -= n
+            if self.buffered > self.max_buffered:
+                return
+            waiters, self._waiters = self._waiters, []
+
+        # NOTE Waiters are woken in their own event loop, as this runs in a writer thread.
+        for waiter in waiters:
+            waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+
+    def _work(self, q):
+        while (item := q.get()) is not None:
+            op, f, pos, data = item
+            try:
+                if f.error is None:
+                    self._process(op, f, pos, data)
+            except Exception as e:
+                # NOTE Whatever goes wrong, the thread carries on, or nobody would be left to
+                # write the rest of its queue, nor to release what's buffered.
+                f.error = e
+                self._errors.append(e)
+                if (fd := self._fds.pop(f, None)) is not None:
+                    os.close(fd)
+            finally:
+                if op == _WRITE:
+                    self._release(len(data))
+
+    def _process(self, op, f, pos, data):
+        if op == _OPEN:
+            # NOTE `pos' is the size of the file here, if known, and `data' whether to truncate it.
+            self.makedirs(os.path.dirname(f.name))
+            fd = self._fds[f] = os.open(f.name, os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if data else 0), 0o666)
+            if pos and pos >= MIN_PREALLOCATE_SIZE and hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(fd, 0, pos)
+                except OSError:
+                    pass  # Not supported by the filesystem; no harm done.
+        elif op == _WRITE:
+            fd = self._fds[f]
+            view = memoryview(data)
+            while view:
+                n = os.pwrite(fd, view, pos)
+                view = view[n:]
+                pos += n
+        elif op == _CALL:
+            data()
+        else:
+            os.close(self._fds.pop(f))
+
+    def close(self):
+        """Wait for everything to be written; raises the first error of the writers, if any."""
+        for q in self._queues:
+            q.put(None)
+        for thread in self._threads:
+            thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+    async def aclose(self):
+        """Same as `close', in a worker thread, so as not to block the event loop."""
+        await asyncio.to_thread(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
@@ -1,13 +1,15 @@
+import sys
+import time
+import importlib
 import zlib
-import bz2
-import lzma
-import compression.zstd
+import asyncio
 
-import httpx
-
-from enum import Enum
+from array import array
 from struct import Struct
-from dataclasses import dataclass
+from itertools import repeat
+from operator import add, getitem, attrgetter
+from contextlib import aclosing, nullcontext
+from dataclasses import replace
 
 from .stubs import (
     _LFHStub,
@@ -15,6 +17,33 @@ from .stubs import (
     _EOCDStub,
     _EOCD64Stub
 )
+from .entries import (
+    ZipCompression,
+    ZipEntryInfo,
+    EntryTable
+)
+from .codecs import Decoder, crc32_combine
+from .streams import RangeReader
+from .cache import IndexCache
+from .blocks import BlockCache
+from .entryfile import EntryFile, DEFAULT_CHECKPOINT_INTERVAL
+from .stats import TransferStats
+from .resume import ResumeState, entry_identity
+from .manifest import Manifest
+from .repack import ZipRepacker
+from .rangesource import RangeSource, MemoryRangeSource, FileRangeSource
+from .pathindex import PathIndex
+from ..utils.asyncio import drain_queue
+from ..utils.files import file_crc32
+from .planner import (
+    RangeSpan,
+    plan_ranges,
+    group_spans,
+    split_ranges,
+    dedupe_entries,
+    estimate_entry_size,
+    DEFAULT_MAX_GAP
+)
 
 _LFHStruct = Struct('<4sHHHHHIIIHH')
 _CDFHStruct = Struct('<4sHHHHHHIIIHHHHHII')
@@ -22,84 +51,176 @@ _EOCDStruct = Struct('<4sHHHHII')
 _EOCD64Struct = Struct('<4sQHHIIQQQQ')
 _EOCD64LocatorStruct = Struct('<4sIQI')
 
-class ZipCompression(Enum):
-    NONE = 0
-    DEFLATE = 8
-    BZIP2 = 12
-    LZMA = 14
-    ZSTANDARD = 93
-
-@dataclass
-class ZipEntryInfo:
-    path: str
-    raw_offset: int
-    file_size: int
-    encrypted: int
-    checksum: int
-    compression: ZipCompression
-    compressed_size: int
-    modified_date: tuple
-    internal_attrs: int
-    external_attrs: int
-
-    @property
-    def is_dir(self):
-        return self.path.endswith('/')
+_CDFH_SIGNATURE = b'\x50\x4B\x01\x02'
+# Fields of a central directory record following its signature, as (offset, size), by the
+# columns of `EntryTable' they go into, when records are parsed in bulk.
+_CDFH_HEADER_SIZE = 42
+_CDFH_FIELDS = {
+    'raw_offset': (38, 4),
+    'file_size': (20, 4),
+    'compressed_size': (16, 4),
+    'checksum': (12, 4),
+    'external_attrs': (34, 4),
+    'bitflag': (4, 2),
+    'compression': (6, 2),
+    'dos_date': (10, 2),
+    'dos_time': (8, 2),
+    'internal_attrs': (32, 2),
+    'path_size': (24, 2),
+    'extra_size': (26, 2),
+    'comment_size': (28, 2),
+}
+# The same columns, by the fields of `_CDFHStub', when records are parsed one by one.
+_CDFH_STUB_FIELDS = {
+    'raw_offset': 'offset',
+    'file_size': 'uncompressed_size',
+    'compressed_size': 'compressed_size',
+    'checksum': 'checksum',
+    'external_attrs': 'external_attrs',
+    'bitflag': 'bitflag',
+    'compression': 'compression_mode',
+    'dos_date': 'file_mdate',
+    'dos_time': 'file_mtime',
+    'internal_attrs': 'internal_attrs',
+    'path_size': 'path_size',
+    'extra_size': 'extra_size',
+}
+
+# Enough to hold an EOCD with the longest possible comment, and the central directory of
+# archives with up to a few hundred entries.
+DEFAULT_TAIL_SIZE = 128 * 1024
+# A record of the central directory carried over from a chunk to the next is parsed together
+# with this much of the next one; enough for the longest possible record to end in it.
+CD_CARRY_SIZE = 256 * 1024
+# Entries are only split into segments of at least this size.
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+# Chunks buffered per segment, while waiting for the preceding segments to be decompressed.
+SEGMENT_QUEUE_SIZE = 64
+# Compressed data is handed to worker threads in batches of about this size.
+DECODE_BATCH_SIZE = 256 * 1024
+# Compressed inner Zip files are read at random all the time, so they are checkpointed densely.
+NESTED_CHECKPOINT_INTERVAL = 1024 * 1024
+
+def _cd_column(words, offset, size, typecode):
+    """A field of records laid back to back, e.g. their headers, as an array; `words' is the
+    records as 16-bit words, since all fields are aligned to them."""
+    stride = _CDFH_HEADER_SIZE // 2
+    low = words[offset // 2::stride]
+    if size == 2:
+        return array(typecode, low.tobytes())
+
+    column = array(typecode, bytes(len(low) * array(typecode).itemsize))
+    view = memoryview(column).cast('B').cast('H')
+    step = column.itemsize // 2
+    view[0::step] = low
+    view[1::step] = words[offset // 2 + 1::stride]
+    return column
+
+def _cd_gather(pieces, lengths):
+    """Columns and paths of records, as split at their signatures; None if their sizes don't
+    add up to their lengths (see `ZipReader._parse_cd_batch')."""
+    # NOTE Fields are little-endian, and read as native integers.
+    if sys.byteorder != 'little':
+        return None
+
+    n = len(pieces)
+    headers = b''.join(map(getitem, pieces, repeat(slice(0, _CDFH_HEADER_SIZE))))
+    if len(headers) != n * _CDFH_HEADER_SIZE:
+        return None
+
+    words = memoryview(headers).cast('H')
+    columns = {name: _cd_column(words, *_CDFH_FIELDS[name], typecode)
+               for name, typecode in (*EntryTable._COLUMNS, ('comment_size', 'H'))}
+    path_size, extra_size, comment_size = (columns[name] for name in ('path_size', 'extra_size', 'comment_size'))
+
+    if list(map(add, map(add, map(add, path_size, extra_size), comment_size),
+                repeat(_CDFH_HEADER_SIZE))) != lengths:
+        return None
+
+    if any(extra_size) or any(comment_size):
+        paths = b''.join(map(getitem, pieces, map(slice, repeat(_CDFH_HEADER_SIZE),
+                                                  map(add, path_size, repeat(_CDFH_HEADER_SIZE)))))
+    else:
+        paths = b''.join(map(getitem, pieces, repeat(slice(_CDFH_HEADER_SIZE, None))))
+
+    return columns, paths
 
 class ZipError(Exception):
     pass
 
 class HTTPError(Exception):
-    pass
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
 
+    @property
+    def transient(self):
+        """Whether it's a server error, which may well not happen again."""
+        return self.status_code is not None and self.status_code >= 500
 
-class HTTPZipReader:
-    def __init__(self, url: str, *, httpx_args=None):
-        httpx_args = httpx_args or {}
 
+class ZipReader:
+    """Reader of a Zip file by ranges of its bytes, wherever they come from: the central
+    directory is parsed as it streams in, and entries are extracted by spans of neighbours.
+    Where the bytes come from is up to subclasses, by `_stream' and `load_entries'; see
+    `HTTPZipReader', `SourceZipReader' and `NestedZipReader'."""
+
+    def __init__(self, url, *, cache: IndexCache = None, background=False,
+                 tail_size=DEFAULT_TAIL_SIZE, executor=None, stats: TransferStats = None):
+        # NOTE `url' identifies the archive, for caching and resuming; it's not necessarily
+        # where it's read from.
         self.url = url
+        self.stats = stats or TransferStats()
         self.entries = None
+        # Number of entries as told by the EOCD; `entries' may hold fewer while loading.
+        self.n_entries = 0
         self.size = 0
-        self.client = httpx.AsyncClient(follow_redirects=True, http2=True, **httpx_args)
-
-    async def _request(self, start, end=None, *, stream=False, httpx_args=None):
-        if httpx_args is None:
-            httpx_args = {}
-        if start < 0:
-            raise ValueError(f"Range can't beginning with {start}; clamping.")
-        if end is None:
-            end = self.size
-        if start >= end:
-            raise ValueError(f"Invalid range {start}-{end}")
-
-        httpx_args = httpx_args or {}
-        headers = httpx_args.setdefault('headers', {})
-        headers['Range'] = f'bytes={int(start)}-{int(end) - 1}'
-
-        request = self.client.build_request('GET', self.url, **httpx_args)
-        r = await self.client.send(request, stream=stream)
-        if r.status_code != 206:
-            raise HTTPError(f"Got status code {r.status_code} for {self.url}")
-
-        return r
-
-    async def _parse_eocd(self):
-        r = await self._request(max(0, self.size - 65557))
-        start_offset = r.content.rfind(b'\x50\x4B\x05\x06')
+        self.background = background
+        self.tail_size = tail_size
+        # Where decompression runs; None for the default executor of the event loop.
+        self.executor = executor
+        self._cd_size = 0
+        self._loader = None
+        self._progress = asyncio.Event()
+        self._path_index = None
+        self.cache = cache
+        self.validators = None
+        # Offsets to the data of entries, keyed by the offsets of their local headers.
+        self.data_offsets = {}
+        self._cached_offsets = set()
+        # Checkpoints of decompressors of entries opened for random access.
+        self.checkpoints = {}
+
+    def _stream(self, start, end=None):
+        """Stream a range of the file, as an async iterator of chunks; these may be memoryviews."""
+        raise NotImplementedError
+
+    async def _read(self, start, end):
+        return b''.join([chunk async for chunk in self._stream(start, end)])
+
+    async def _read_at(self, tail, tail_start, offset, size):
+        """Read from the buffered tail of the file if it covers the range, or else request it."""
+        if offset >= tail_start:
+            return tail[offset - tail_start:offset - tail_start + size]
+
+        return await self._read(offset, offset + size)
+
+    def _parse_eocd(self, tail, tail_start):
+        start_offset = tail.rfind(b'\x50\x4B\x05\x06')
 
         if start_offset == -1:
             raise ZipError(f"EOCD Signature not found")
 
-        stub = _EOCDStub._make(_EOCDStruct.unpack(r.content[start_offset:start_offset + 20]))
+        stub = _EOCDStub._make(_EOCDStruct.unpack_from(tail, start_offset))
         if (stub.disk != stub.begin_disk or
                 stub.ents_on_disk != stub.ents_total):
             raise ZipError("Multipart Zip files aren't supported")
 
-        return stub, (self.size - len(r.content) + start_offset)
+        return stub, tail_start + start_offset
 
-    async def _parse_eocd64(self, offset):
-        r = await self._request(offset, offset + 56)
-        stub = _EOCD64Stub._make(_EOCDStruct.unpack(r.content))
+    async def _parse_eocd64(self, tail, tail_start, offset):
+        data = await self._read_at(tail, tail_start, offset, _EOCD64Struct.size)
+        stub = _EOCD64Stub._make(_EOCD64Struct.unpack(data))
 
         if stub.signature != b'\x50\x4B\x06\x06':
             raise ZipError(f"Invalid EOCD signature: {stub.signature.hex()}")
@@ -108,186 +229,679 @@ class HTTPZipReader:
                 stub.ents_on_disk != stub.ents_total):
             raise ZipError("Multipart Zip files are not supported")
 
-    async def _parse_eocd64_locator(self, eocd_start):
-        r = await self._request(eocd_start - 20, eocd_start)
+        return stub
+
+    async def _parse_eocd64_locator(self, tail, tail_start, eocd_start):
+        data = await self._read_at(tail, tail_start, eocd_start - 20, 20)
 
-        signature, disk, offset, n_disks = _EOCD64LocatorStruct.unpack(r.content)
+        signature, disk, offset, n_disks = _EOCD64LocatorStruct.unpack(data)
         if signature != b'\x50\x4B\x06\x07':
             raise ZipError(f"Invalid EOCD64 signature: {signature.hex()}")
-        if disk != 0 or n_disks == 1:
+        if disk != 0 or n_disks > 1:
             raise ZipError("Multipart Zip files aren't supported")
 
         return offset
 
     @staticmethod
     def _detect_zip64_from_eocd(stub: _EOCDStub):
-        if (stub.disk == 0xFFFF and stub.ents_total == 0xFFF and
-            stub.cd_size == 0xFFFFFFF and stub.cd_offset == 0xFFFFFFFF):
-            return True
-        else:
-            return False
+        # NOTE Any of the fields could be saturated, not necessarily all of them.
+        return (stub.ents_total == 0xFFFF or
+                stub.cd_size == 0xFFFFFFFF or
+                stub.cd_offset == 0xFFFFFFFF)
 
     @staticmethod
     def _parse_extras(extras):
         offset = 0
         size = len(extras)
 
-        while offset < size:
+        while offset + 4 <= size:
             eid = extras[offset:offset + 2]
-            size = int.from_bytes(extras[offset + 2:offset + 4], byteorder='little')
-            data = extras[offset + 4:offset + size]
+            data_size = int.from_bytes(extras[offset + 2:offset + 4], byteorder='little')
+            data = extras[offset + 4:offset + 4 + data_size]
+            offset += 4 + data_size
 
             yield eid, data
 
     @staticmethod
-    def _parse_zip64_extra(data):
-        size = len(data)
-        uncompressed, compressed, offset = None, None, None
+    def _parse_zip64_extra(stub, data):
+        # NOTE Only the fields saturated in the record are present, in this order.
+        fields = {}
+        for name in ('uncompressed_size', 'compressed_size', 'offset'):
+            if getattr(stub, name) == 0xFFFFFFFF and len(data) >= 8:
+                fields[name] = int.from_bytes(data[:8], byteorder='little')
+                data = data[8:]
+
+        return stub._replace(**fields)
+
+    def _parse_cd_batch(self, cd, final=False):
+        """Parse the records at the start of `cd' in bulk, a field of all of them at a time,
+        rather than one by one: it's split at the signatures, and the fixed-size headers of
+        the records gathered to read the fields out of.
+        Returns the columns of the records (see `EntryTable.extend'), their paths and the
+        bytes parsed, or None if it has to be done one by one, after all.
+
+        The last record is left for the next batch, unless it's `final'."""
+        pieces = bytes(cd).split(_CDFH_SIGNATURE)
+        if pieces[0]:
+            return None
+        pieces = pieces[1:] if final else pieces[1:-1]
+        if not pieces:
+            return None
+
+        # NOTE A path, extra field or comment that happens to contain a signature splits its
+        # record in two, and then the sizes of the records don't add up.
+        lengths = list(map(len, pieces))
+        gathered = _cd_gather(pieces, lengths)
+        if gathered is None:
+            return None
+        columns, paths = gathered
+
+        # Extras are only of interest if any field is saturated, needing Zip64.
+        # NOTE The values are of 32 bits, so only a saturated one has four 0xFF bytes in a row.
+        saturated = [columns['compressed_size'], columns['file_size'], columns['raw_offset']]
+        if any(b'\xff\xff\xff\xff' in column.tobytes() for column in saturated):
+            for i in range(len(pieces)):
+                if any(column[i] == 0xFFFFFFFF for column in saturated):
+                    stub = _CDFHStub._make(_CDFHStruct.unpack_from(_CDFH_SIGNATURE + pieces[i]))
+                    stub = self._apply_zip64_extra(stub, pieces[i][_CDFH_HEADER_SIZE + stub.path_size:])
+                    columns['compressed_size'][i] = stub.compressed_size
+                    columns['file_size'][i] = stub.uncompressed_size
+                    columns['raw_offset'][i] = stub.offset
+
+        return columns, paths, sum(lengths) + len(pieces) * len(_CDFH_SIGNATURE)
+
+    def _parse_cd_serial(self, cd):
+        """Parse the whole records at the start of `cd' one by one; see `_parse_cd_batch'."""
+        stubs = []
+        paths = []
+        pos = 0
+
+        while pos + 46 <= len(cd):
+            stub = _CDFHStub._make(_CDFHStruct.unpack_from(cd, pos))
+            end = pos + 46 + stub.path_size + stub.extra_size + stub.comment_size
+            if end > len(cd):
+                break
+
+            if stub.signature != _CDFH_SIGNATURE:
+                raise ZipError(f"Invalid CDFH signature: {stub.signature.hex()}")
+
+            pos += 46
+            paths.append(cd[pos:pos + stub.path_size])
+            pos += stub.path_size
+
+            if 0xFFFFFFFF in (stub.compressed_size, stub.uncompressed_size, stub.offset):
+                stub = self._apply_zip64_extra(stub, cd[pos:pos + stub.extra_size])
+
+            pos = end
+            stubs.append(stub)
+
+        columns = {name: array(typecode, map(attrgetter(_CDFH_STUB_FIELDS[name]), stubs))
+                   for name, typecode in EntryTable._COLUMNS}
+        return columns, b''.join(paths), pos
+
+    def _apply_zip64_extra(self, stub, extras):
+        for eid, data in self._parse_extras(extras):
+            if eid == b'\x01\x00':
+                stub = self._parse_zip64_extra(stub, data)
+
+        return stub
+
+    async def _parse_cd_ents(self, chunks):
+        """Parse the central directory as it streams in, yielding the entries of each chunk
+        as columns and paths; see `EntryTable.extend'."""
+        # NOTE Only a chunk is held at a time; a record spanning two chunks is carried over,
+        # and parsed together with the start of the next one, rather than the two joined.
+        carry = b''
+
+        async for chunk in chunks:
+            cd = memoryview(chunk)
+            if carry:
+                head = bytes(carry) + cd[:CD_CARRY_SIZE]
+                columns, paths, pos = self._parse_cd_batch(head) or self._parse_cd_serial(head)
+                if pos:
+                    yield columns, paths
+                if pos < len(carry):
+                    # The chunk is too short to finish the record.
+                    carry = head[pos:] + cd[CD_CARRY_SIZE:]
+                    continue
+                cd = cd[pos - len(carry):]
+
+            columns, paths, pos = self._parse_cd_batch(cd) or self._parse_cd_serial(cd)
+            carry = cd[pos:]
+            if pos:
+                yield columns, paths
+
+        if carry:
+            columns, paths, pos = self._parse_cd_batch(carry, final=True) or self._parse_cd_serial(carry)
+            if pos:
+                yield columns, paths
+
+    async def _calc_data_offset(self, offset: int) -> int:
+        if data_offset := self.data_offsets.get(offset):
+            return data_offset
 
-        if size >= 8:
-            uncompressed = int.from_bytes(data[:8], byteorder='little')
-        if size >= 16:
-            compressed = int.from_bytes(data[8:16], byteorder='little')
-        if size >= 32:
-            offset = int.from_bytes(data[16:24], byteorder='little')
+        with self.stats.phase('lfh'):
+            lfh = _LFHStub._make(_LFHStruct.unpack(await self._read(offset, offset + 30)))
 
-        return uncompressed, compressed, offset
+        # NOTE An encrypted file has encryption header following LFH.
+        data_offset = self.data_offsets[offset] = (offset
+                                                   + 30  # LFH
+                                                   + lfh.path_size
+                                                   + lfh.extra_size)
+        return data_offset
+
+    async def load_entries(self, *, background=False):
+        """Load the entries of the archive. In the background mode, this returns as soon
+        as the central directory is located, and `entries' fills up as it is parsed."""
+        raise NotImplementedError
+
+    def _load_cached(self, cached):
+        """Take the entries, and the offsets to their data known so far, from the cache."""
+        self.entries = cached.entries
+        self.n_entries = len(cached.entries)
+        self.data_offsets.update(cached.data_offsets)
+        self._cached_offsets = set(cached.data_offsets)
+
+    async def _load_tail(self, tail, tail_start, *, background=False):
+        """Locate the central directory from the tail of the file, and load it."""
+        with self.stats.phase('eocd'):
+            eocd, eocd_start = self._parse_eocd(tail, tail_start)
+
+            # Load EOCD64 if Zip64 detected, and replace original EOCD.
+            if self._detect_zip64_from_eocd(eocd):
+                eocd64_start = await self._parse_eocd64_locator(tail, tail_start, eocd_start)
+                eocd = await self._parse_eocd64(tail, tail_start, eocd64_start)
+
+        self.entries = EntryTable()
+        self.n_entries = eocd.ents_total
+        self._cd_size = eocd.cd_size
+
+        chunks = self._cd_chunks(eocd.cd_offset, eocd.cd_size, tail, tail_start)
+        if background:
+            self._loader = asyncio.create_task(self._load_cd_ents(chunks))
+        else:
+            await self._load_cd_ents(chunks)
+
+    async def _cd_chunks(self, offset, size, tail, tail_start):
+        """Chunks of the central directory; only the part not in the buffered tail is requested."""
+        end = offset + size
+        if offset < tail_start:
+            async for chunk in self._stream(offset, min(end, tail_start)):
+                yield chunk
+
+        if end > tail_start:
+            yield tail[max(offset, tail_start) - tail_start:end - tail_start]
+
+    async def _load_cd_ents(self, chunks):
+        try:
+            with self.stats.phase('central_directory'):
+                async for columns, paths in self._parse_cd_ents(chunks):
+                    self.entries.extend(columns, paths)
+                    self._progress.set()
+        finally:
+            self._progress.set()
+
+        # NOTE Without a validator, there is no telling whether a cached index is stale.
+        if self.cache and (self.validators['etag'] or self.validators['last_modified']):
+            self.cache.store(self.url, self.validators, self.entries, cd_size=self._cd_size)
+
+    @property
+    def loaded(self):
+        return self._loader is None or self._loader.done()
 
-    async def _parse_cd_ents(self, offset, size):
-        r = await self._request(offset, offset + size)
-        cd = r.content
+    async def wait_entries(self, n):
+        """Wait until at least `n' entries are loaded, or there's nothing more to load."""
+        while len(self.entries) < n and not self.loaded:
+            self._progress.clear()
+            await self._progress.wait()
 
-        offset = 0
-        while offset < size:
-            stub = _CDFHStub._make(_CDFHStruct.unpack(cd[offset:offset + 46]))
-            offset += 46
+    async def wait_loaded(self):
+        """Wait until all entries are loaded, raising whatever went wrong meanwhile."""
+        if self._loader is not None:
+            await self._loader
 
-            raw_path = cd[offset:offset + stub.path_size]
-            offset += stub.path_size
+    async def path_index(self):
+        """Index of the entries by path, built once all of them are loaded."""
+        await self.wait_loaded()
 
-            extras = dict(self._parse_extras(cd[offset:offset + stub.extra_size]))
-            offset += stub.extra_size
-            offset += stub.comment_size
+        if self._path_index is None:
+            self._path_index = PathIndex(self.entries)
+        return self._path_index
 
-            # TODO Consider "UPath" extra field for completeness sake
-            if stub.bitflag & 0b10000000000:
-                path = raw_path.decode('utf-8', errors='replace')
-            else:
-                path = raw_path.decode('cp437')
+    def check_loaded(self):
+        """Raise whatever went wrong while loading in the background, if anything."""
+        if self._loader is not None and self._loader.done():
+            self._loader.result()
 
-            if zip64_extra := extras.get(b'\x01\x00'):
-                uncompressed, compressed, offset = self._parse_zip64_extra(zip64_extra)
+    @property
+    def max_streams(self):
+        """Concurrent requests the file is best read with, if known."""
+        return None
+
+    async def extract(self, info, output, *, segments=1, resume: ResumeState = None):
+        """Extract an entry in a single round trip: the local header and the data are
+        requested together, based on the sizes known from the central directory.
+
+        With `segments' > 1, a large entry is instead downloaded in that many parts
+        concurrently, for servers that throttle each connection. With `resume', only what
+        an earlier extraction left missing is downloaded, and progress is recorded there;
+        see `ResumeState'."""
+        segments = max(min(segments, info.compressed_size // MIN_SEGMENT_SIZE), 1)
+        if (segments > 1 or resume) and not info.encrypted:
+            started = time.perf_counter()
+            async for processed in self._extract_segmented(info, output, segments, resume):
+                yield processed
+
+            self.stats.record_entry(info, time.perf_counter() - started)
+            return
 
-                if stub.compressed_size == 0xFF:
-                    stub.compressed_size = compressed
-                if stub.uncompressed_size == 0xFF:
-                    stub.uncompressed_size = uncompressed
-                if stub.offset == 0xFF:
-                    stub.offset = offset
+        end = min(info.raw_offset + estimate_entry_size(info), self.size)
+        span = RangeSpan(info.raw_offset, end, [info])
 
-            yield path, stub
+        async for processed in self.extract_span(span, lambda _: nullcontext(output)):
+            yield processed
 
-    async def _calc_data_offset(self, offset: int) -> int:
-        r = await self._request(offset, offset + 30)
-        lfh = _LFHStub._make(_LFHStruct.unpack(r.content))
+    def open(self, info, *, interval=DEFAULT_CHECKPOINT_INTERVAL):
+        """Open an entry for random access, as an async file-like object with `read' and
+        `seek'; see `EntryFile'."""
+        if info.encrypted:
+            raise ZipError("Encrypted files are not supported")
 
-        # NOTE An encrypted file has encryption header following LFH.
-        return (offset
-                + 30  # LFH
-                + lfh.path_size
-                + lfh.extra_size)
+        return EntryFile(self, info, interval=interval)
+
+    def open_archive(self, info):
+        """Open an entry that is a Zip file itself, without downloading it; see `NestedZipReader'."""
+        if info.encrypted:
+            raise ZipError("Encrypted files are not supported")
+
+        return NestedZipReader(self, info)
+
+    async def _extract_from(self, reader, info, output):
+        """Extract an entry from a reader positioned at, or before, its local header."""
+        if info.raw_offset < reader.pos:
+            raise ZipError(f"Entry at {info.raw_offset} overlaps with the previous one")
+        started = time.perf_counter()
+
+        await reader.skip(info.raw_offset - reader.pos)
+        lfh = _LFHStub._make(_LFHStruct.unpack(await reader.read(30)))
+        if lfh.signature != b'\x50\x4B\x03\x04':
+            raise ZipError(f"Invalid LFH signature: {lfh.signature.hex()}")
+
+        # NOTE If the local extra field is larger than estimated, a small request is made for
+        # just the missing bytes; the header tells exactly how many.
+        reader.expect(reader.pos + lfh.path_size + lfh.extra_size + info.compressed_size)
+        await reader.skip(lfh.path_size + lfh.extra_size)
+        self.data_offsets[info.raw_offset] = reader.pos
+
+        if info.encrypted and info.compressed_size:
+            raise ZipError("Encrypted files are not supported")
+
+        if info.compressed_size:
+            async for processed in self._decode(info, reader.chunks(info.compressed_size), output):
+                yield processed
+
+        self.stats.record_entry(info, time.perf_counter() - started)
+
+    async def _copy_from(self, reader, info, output):
+        """Copy the local header and compressed data of an entry as they are, from a reader
+        positioned at, or before, the header; see `ZipRepacker'."""
+        if info.raw_offset < reader.pos:
+            raise ZipError(f"Entry at {info.raw_offset} overlaps with the previous one")
+        started = time.perf_counter()
+
+        await reader.skip(info.raw_offset - reader.pos)
+        header = bytes(await reader.read(30))
+        lfh = _LFHStub._make(_LFHStruct.unpack(header))
+        if lfh.signature != b'\x50\x4B\x03\x04':
+            raise ZipError(f"Invalid LFH signature: {lfh.signature.hex()}")
+
+        reader.expect(reader.pos + lfh.path_size + lfh.extra_size + info.compressed_size)
+        header += await reader.read(lfh.path_size + lfh.extra_size)
+        self.data_offsets[info.raw_offset] = reader.pos
+
+        output.write_header(lfh, header)
+        async for chunk in reader.chunks(info.compressed_size):
+            output.write(chunk)
+            yield len(chunk)
+
+        self.stats.record_entry(info, time.perf_counter() - started)
+
+    async def repack(self, entries, f, *, max_gap=DEFAULT_MAX_GAP, multipart=True):
+        """Write entries to `f' as a new Zip file, without decompressing and compressing them
+        again; see `ZipRepacker'. Entries are fetched as by `extract_spans', one batch after
+        another, and the compressed bytes copied are yielded as they go."""
+        repacker = ZipRepacker(f)
+        spans = plan_ranges(entries, max_gap=max_gap, limit=self.size)
+
+        for group in group_spans(spans) if multipart else [[span] for span in spans]:
+            async for processed in self.extract_spans(group, repacker.open, raw=True):
+                yield processed
+
+        repacker.close()
+
+    async def _decode(self, info, chunks, output):
+        """Decompress and checksum chunks of an entry in a worker thread, so that the event
+        loop only moves bytes around. While one batch is being decoded, the next one is read
+        from the network; no more than that is held in memory."""
+        loop = asyncio.get_running_loop()
+        decoder = Decoder(info.compression)
+        pending = None
+        batch = []
+        batch_size = 0
+
+        def decode(data, final=False):
+            started = time.perf_counter()
+            data = decoder.decode(data, final)
+            return data, time.perf_counter() - started
+
+        async for chunk in chunks:
+            batch.append(chunk)
+            batch_size += len(chunk)
+            if batch_size < DECODE_BATCH_SIZE:
+                continue
+
+            if pending:
+                yield self._write(output, *await pending)
+
+            pending = loop.run_in_executor(self.executor, decode, self._join(batch))
+            batch = []
+            batch_size = 0
+
+        if pending:
+            yield self._write(output, *await pending)
+
+        yield self._write(output, *await loop.run_in_executor(self.executor, decode, self._join(batch), True))
+
+        if decoder.crc != info.checksum:
+            raise ZipError(f"CRC mismatch for {info.path}: "
+                           f"expected {info.checksum:08x}, got {decoder.crc:08x}")
 
     @staticmethod
-    def _parse_msdos_date(date, time):
-        # See: https://learn.microsoft.com/en-us/windows/win32/api/winbase/nf-winbase-dosdatetimetofiletime
-        # Microsoft was retarded from its early days.
-        year = (date >> 9) + 1980
-        month = date >> 5 & 0xF
-        day = date & 0x1F
-        hour = time >> 11
-        minute = time >> 5 & 0x3F
-        second = time & 0x1F
-
-        return year, month, day, hour, minute, second * 2
-
-    async def load_entries(self):
-        if self.entries is not None:
-            return
+    def _join(batch):
+        # NOTE A batch of a single chunk is passed on as it is, which saves copying a view.
+        return batch[0] if len(batch) == 1 else b''.join(batch)
 
-        r = await self.client.head(self.url)
-        if r.status_code != 200:
-            raise HTTPError(f"Got status code {r.status_code} for {self.url}")
-        if r.headers.get('Accept-Ranges') != 'bytes':
-            raise HTTPError(f"Range requests not supported on {self.url}")
+    def _write(self, output, data, decode_time):
+        self.stats.record_phase('decompress', decode_time)
 
-        if size := r.headers.get('Content-Length'):
-            self.size = int(size)
-        else:
-            raise HTTPError(f"Unable to determine length of zip file for {self.url}")
-
-        eocd, eocd_start = await self._parse_eocd()
-
-        # Load EOCD64 if Zip64 detected, and replace original EOCD.
-        if self._detect_zip64_from_eocd(eocd):
-            eocd64_start = await self._parse_eocd64_locator(eocd_start)
-            eocd = await self._parse_eocd64(eocd64_start)
-
-        self.entries = [ZipEntryInfo(path=path,
-                                     raw_offset=info.offset,
-                                     file_size=info.uncompressed_size,
-                                     checksum=info.checksum,
-                                     encrypted=bool(info.bitflag & 1),
-                                     compression=ZipCompression(info.compression_mode),
-                                     compressed_size=info.compressed_size,
-                                     modified_date=self._parse_msdos_date(info.file_mdate, info.file_mtime),
-                                     internal_attrs=info.internal_attrs,
-                                     external_attrs=info.external_attrs)
-                        async for path, info in self._parse_cd_ents(eocd.cd_offset, eocd.cd_size)]
-
-    async def extract(self, info, output):
+        started = time.perf_counter()
+        output.write(data)
+        self.stats.record_phase('write', time.perf_counter() - started)
+
+        return len(data)
+
+    async def _extract_segmented(self, info, output, n, resume=None):
         offset = await self._calc_data_offset(info.raw_offset)
 
-        # Nothing to do, so exit.
-        if not info.compressed_size:
+        if info.compression == ZipCompression.NONE:
+            # Stored data is written straight at its place in the output, as it arrives.
+            base = output.tell()
+            progress = asyncio.Queue()
+            missing = resume.missing(info.file_size) if resume else [(0, info.file_size)]
+            # CRCs of the ranges of the output, as (start, end, crc), to be put together in order.
+            crcs = []
+
+            async def fetch_stored(start, end):
+                pos = start
+                crc = 0
+                async for chunk in self._stream(offset + start, offset + end):
+                    output.seek(base + pos)
+                    self._write(output, chunk, 0)
+                    crc = zlib.crc32(chunk, crc)
+                    if resume:
+                        resume.record(pos, pos + len(chunk))
+                    pos += len(chunk)
+                    progress.put_nowait(len(chunk))
+
+                if pos < end:
+                    raise EOFError(f"Unexpected end of stream at {offset + pos}")
+                crcs.append((start, end, crc))
+
+            async def check_written(start, end):
+                # NOTE What an earlier extraction wrote is read back, as it may have been
+                # tampered with since.
+                crcs.append((start, end, await asyncio.to_thread(file_crc32, resume.path, start, end)))
+
+            written = list(resume.done) if resume else []
+            tasks = [asyncio.create_task(fetch_stored(start, end)) for start, end in split_ranges(missing, n)]
+            tasks += [asyncio.create_task(check_written(start, end)) for start, end in written]
+            async for processed in drain_queue(progress, tasks):
+                yield processed
+
+            crc = 0
+            for start, end, range_crc in sorted(crcs):
+                crc = crc32_combine(crc, range_crc, end - start)
+            if crc != info.checksum:
+                # Whatever was written can't be trusted any longer.
+                if resume:
+                    resume.reset()
+                raise ZipError(f"CRC mismatch for {info.path}: "
+                               f"expected {info.checksum:08x}, got {crc:08x}")
+
+            output.seek(base + info.file_size)
             return
-        if info.encrypted:
-            raise ZipError("Encrypted files are not supported")
 
-        r = await self._request(offset, offset + info.compressed_size, stream=True)
-
-        match info.compression:
-            case ZipCompression.NONE:
-                decompressor = None
-            case ZipCompression.DEFLATE:
-                # Negative value for raw DEFLATE
-                decompressor = zlib.decompressobj(-15)
-            case ZipCompression.BZIP2:
-                decompressor = bz2.BZ2Decompressor()
-            case ZipCompression.LZMA:
-                decompressor = lzma.LZMADecompressor()
-            case ZipCompression.ZSTANDARD:
-                decompressor = compression.zstd.ZstdDecompressor()
-            case _:
-                raise NotImplementedError
-
-        if decompressor:
-            async for chunk in r.aiter_bytes():
-                decompressed = decompressor.decompress(chunk)
-                output.write(decompressed)
-                yield len(decompressed)
-
-            decompressed = decompressor.flush()
-            output.write(decompressed)
-            yield len(decompressed)
-        else:
-            async for chunk in r.aiter_bytes():
-                output.write(chunk)
-                yield len(chunk)
+        # NOTE Compressed data spooled by an earlier extraction is decompressed again, but
+        # not downloaded again.
+        spooled = resume.spooled if resume else 0
+        ranges = split_ranges([(offset + spooled, offset + info.compressed_size)], n)
+
+        # Compressed data has to be fed to the decompressor in order, so segments ahead of
+        # the current one are buffered in bounded queues; a full queue stalls its download.
+        queues = [asyncio.Queue(maxsize=SEGMENT_QUEUE_SIZE) for _ in ranges]
+
+        async def fetch(queue, start, end):
+            try:
+                async for chunk in self._stream(start, end):
+                    await queue.put(chunk)
+            except Exception as e:
+                await queue.put(e)
+            else:
+                await queue.put(None)
+
+        async def reorder():
+            if resume:
+                async for chunk in resume.spooled_chunks():
+                    yield chunk
+
+            for queue in queues:
+                while (chunk := await queue.get()) is not None:
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    if resume:
+                        resume.spool(chunk)
+                    yield chunk
+
+        tasks = [asyncio.create_task(fetch(queue, start, end))
+                 for queue, (start, end) in zip(queues, ranges)]
+        try:
+            async for processed in self._decode(info, reorder(), output):
+                yield processed
+        except ZipError:
+            # Whatever was spooled can't be trusted any longer.
+            if resume:
+                resume.reset()
+            raise
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _extract_span_from(self, reader, span, open_output, raw=False):
+        for info in span.entries:
+            # NOTE A skipped entry is just read past by the next one.
+            if not (output := open_output(info)):
+                continue
+
+            with output as f:
+                extract_from = self._copy_from if raw else self._extract_from
+                async for processed in extract_from(reader, info, f):
+                    yield processed
+
+    async def extract_span(self, span: RangeSpan, open_output, *, raw=False):
+        """Extract all entries of a span with a single range request. Outputs are
+        obtained through `open_output', which may return None to skip an entry. With
+        `raw', entries are copied as they are instead; see `_copy_from'."""
+        reader = RangeReader(self._stream(span.start, span.end), span.start, fetch=self._stream)
+
+        async with aclosing(reader):
+            async for processed in self._extract_span_from(reader, span, open_output, raw):
+                yield processed
+
+    async def extract_spans(self, spans, open_output, *, raw=False):
+        """Extract entries of several spans, one span after another; see `extract_span'."""
+        for span in sorted(spans, key=lambda span: span.start):
+            async for processed in self.extract_span(span, open_output, raw=raw):
+                yield processed
 
     async def __aenter__(self):
-        await self.load_entries()
+        try:
+            await self.load_entries(background=self.background)
+        except BaseException:
+            await self.__aexit__(None, None, None)
+            raise
 
         return self
 
     async def __aexit__(self, *args):
-        pass
+        if self._loader is not None and not self._loader.done():
+            self._loader.cancel()
+
+        if self.cache:
+            self.cache.store_offsets(self.url, {offset: data_offset
+                                                for offset, data_offset in self.data_offsets.items()
+                                                if offset not in self._cached_offsets})
+
+
+class NestedZipReader(ZipReader):
+    """Reader of a Zip file stored as an entry of another, with the same operations. Its
+    ranges are read from the parent, at the offsets of the entry in the outer file, so that
+    browsing it costs just its central directory, not the whole of it; entries of it are
+    extracted by the parent too, as if they were its own, so they're fetched as the parent
+    fetches its own (e.g. with multi-range requests), and cached where it caches them.
+
+    An inner Zip file that is compressed is instead read through `EntryFile', which can
+    only seek quickly to where it has already decompressed once."""
+
+    def __init__(self, parent: ZipReader, info):
+        super().__init__(parent.url, background=parent.background, tail_size=parent.tail_size,
+                         executor=parent.executor, stats=parent.stats)
+
+        self.parent = parent
+        self.info = info
+        self.size = info.file_size
+        self.validators = parent.validators
+        self._base = None
+
+    @property
+    def _compressed(self):
+        return self.info.compression != ZipCompression.NONE
+
+    @property
+    def max_streams(self):
+        return self.parent.max_streams
+
+    async def _stream(self, start, end=None):
+        if end is None:
+            end = self.size
+
+        if not self._compressed:
+            async for chunk in self.parent._stream(self._base + start, self._base + end):
+                yield chunk
+            return
+
+        async with self.parent.open(self.info, interval=NESTED_CHECKPOINT_INTERVAL) as f:
+            f.seek(start)
+            while start < end:
+                if not (chunk := await f.read(min(end - start, DECODE_BATCH_SIZE))):
+                    raise EOFError(f"Unexpected end of {self.info.path} at {start}")
+
+                start += len(chunk)
+                yield chunk
+
+    async def extract_spans(self, spans, open_output, *, raw=False):
+        if self._compressed:
+            async for processed in super().extract_spans(spans, open_output, raw=raw):
+                yield processed
+            return
+
+        # Entries as the parent sees them, by their offsets in the outer file.
+        inner = {}
+
+        def shift(info):
+            outer = replace(info, raw_offset=self._base + info.raw_offset)
+            inner[outer.raw_offset] = info
+            return outer
+
+        outer_spans = [RangeSpan(self._base + span.start, self._base + span.end, list(map(shift, span.entries)))
+                       for span in spans]
+        async for processed in self.parent.extract_spans(outer_spans, lambda info: open_output(inner[info.raw_offset]),
+                                                         raw=raw):
+            yield processed
+
+    async def load_entries(self, *, background=False):
+        if self.entries is not None:
+            return
+
+        if not self._compressed:
+            self._base = await self.parent._calc_data_offset(self.info.raw_offset)
+
+        tail_start = max(self.size - self.tail_size, 0)
+        tail = await self._read(tail_start, self.size) if self.size else b''
+
+        await self._load_tail(tail, tail_start, background=background)
+
+
+class SourceZipReader(ZipReader):
+    """Reader of a Zip file from any `RangeSource', e.g. a local file (see `FileRangeSource'),
+    with the same operations as over HTTP. Ranges are streamed from the source as they're
+    needed, one per span; there are no requests to save, so neither multi-range requests
+    nor a block cache are of any use."""
+
+    def __init__(self, source: RangeSource, *, cache: IndexCache = None, background=False,
+                 tail_size=DEFAULT_TAIL_SIZE, executor=None, stats: TransferStats = None):
+        super().__init__(source.url, cache=cache, background=background, tail_size=tail_size,
+                         executor=executor, stats=stats)
+
+        self.source = source
+
+    async def _stream(self, start, end=None):
+        if end is None:
+            end = self.size
+
+        async for chunk in self.source.stream(start, end):
+            self.stats.record_bytes(len(chunk))
+            yield chunk
+
+    async def load_entries(self, *, background=False):
+        if self.entries is not None:
+            return
+
+        self.size = self.source.size
+        self.validators = self.source.validators
+
+        if self.cache and (cached := self.cache.load(self.url)) and cached.validators == self.validators:
+            self._load_cached(cached)
+            return
+
+        tail_start = max(self.size - self.tail_size, 0)
+        tail = await self._read(tail_start, self.size) if self.size else b''
+
+        await self._load_tail(tail, tail_start, background=background)
+
+    async def __aexit__(self, *args):
+        try:
+            await super().__aexit__(*args)
+        finally:
+            self.source.close()
+
+
+# NOTE The HTTP reader, and the pool built on it, are only imported once they're used, and
+# httpx with them, so that reading local files doesn't wait for it.
+_LAZY = {'HTTPZipReader': '.httpreader', 'ArchivePool': '.pool', 'Listing': '.pool'}
+
+def __getattr__(name):
+    if module := _LAZY.get(name):
+        return getattr(importlib.import_module(module, __name__), name)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
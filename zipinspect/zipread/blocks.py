@@ -0,0 +1,93 @@
+import os
+
+from collections import OrderedDict
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+
+class BlockCache:
+    """Cache of fixed-size, aligned blocks of remote files, keyed by the URL and validators
+    of the file, so that bytes fetched once aren't fetched again. It may be shared by
+    several readers; the least recently used blocks are evicted beyond `max_size' bytes.
+
+    Blocks are held in memory, or if `path' is given, in sparse scratch files in that
+    directory, at their own offsets; these files are gone once the cache is closed."""
+
+    def __init__(self, path=None, *, max_size=DEFAULT_MAX_SIZE, block_size=DEFAULT_BLOCK_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.block_size = block_size
+        self.size = 0
+        # Blocks served from the cache, and looked up but not found.
+        self.hits = 0
+        self.misses = 0
+        # (key, index) -> the block, or its size if it's in a file.
+        self._blocks = OrderedDict()
+        self._files = {}
+        self._counts = {}
+
+    def __contains__(self, item):
+        return item in self._blocks
+
+    def covers(self, key, start, end):
+        """Whether all the blocks of a range are cached."""
+        return all((key, index) in self._blocks
+                   for index in range(start // self.block_size, (end - 1) // self.block_size + 1))
+
+    def get(self, key, index):
+        value = self._blocks.get((key, index))
+        if value is None:
+            self.misses += 1
+            return None
+
+        self._blocks.move_to_end((key, index))
+        self.hits += 1
+
+        if isinstance(value, int):
+            return os.pread(self._files[key].fileno(), value, index * self.block_size)
+        return value
+
+    def put(self, key, index, data):
+        if (key, index) in self._blocks:
+            self._blocks.move_to_end((key, index))
+            return
+
+        if self.path is None:
+            value = bytes(data)
+        else:
+            if (f := self._files.get(key)) is None:
+                os.makedirs(self.path, exist_ok=True)
+                # NOTE tempfile imports shutil, and that every compression module there is.
+                import tempfile
+                f = self._files[key] = tempfile.TemporaryFile(dir=self.path)
+            os.pwrite(f.fileno(), data, index * self.block_size)
+            value = len(data)
+
+        self._blocks[key, index] = value
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self.size += len(data)
+
+        while self.size > self.max_size:
+            self._evict()
+
+    def _evict(self):
+        (key, _), value = self._blocks.popitem(last=False)
+        self.size -= value if isinstance(value, int) else len(value)
+        self._counts[key] -= 1
+
+        # NOTE Space of evicted blocks in a file is only reclaimed with the file itself,
+        # once none of its blocks is left.
+        if not self._counts[key]:
+            del self._counts[key]
+            if f := self._files.pop(key, None):
+                f.close()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+        self._blocks.clear()
+        self._files.clear()
+        self._counts.clear()
+        self.size = 0
@@ -0,0 +1,154 @@
+import os
+import json
+import mmap
+import hashlib
+
+from struct import Struct
+
+from .entries import EntryTable
+
+_MAGIC = b'ZIPIDX02'
+_HeaderSizeStruct = Struct('<I')
+_OffsetStruct = Struct('<QQ')
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'zipinspect')
+
+
+class CachedIndex:
+    def __init__(self, validators, entries, data_offsets, cd_size=0):
+        self.validators = validators
+        self.entries = entries
+        self.data_offsets = data_offsets
+        self.cd_size = cd_size
+
+
+class IndexCache:
+    """On-disk cache of parsed central directories, keyed by URL. Indices are stored as
+    the raw columns of an `EntryTable', and only used after being validated against the
+    ETag, Last-Modified and Content-Length of the archive; the least recently used indices
+    are evicted beyond `max_size' bytes."""
+
+    def __init__(self, path=None, *, max_size=DEFAULT_MAX_SIZE):
+        self.path = path or default_cache_dir()
+        self.max_size = max_size
+
+    def _index_path(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.path, f'{key}.idx')
+
+    def load(self, url):
+        path = self._index_path(url)
+
+        try:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                if m[:len(_MAGIC)] != _MAGIC:
+                    return None
+
+                offset = len(_MAGIC)
+                header_size, = _HeaderSizeStruct.unpack_from(m, offset)
+                offset += _HeaderSizeStruct.size
+                header = json.loads(m[offset:offset + header_size])
+                offset += header_size
+
+                # NOTE Columns are copied straight out of the mapping, without any parsing.
+                with memoryview(m) as view:
+                    buffers = []
+                    for size in header['columns']:
+                        buffers.append(view[offset:offset + size])
+                        offset += size
+                    buffers.append(view[offset:])
+
+                    try:
+                        entries = EntryTable.from_buffers(header['count'], buffers[:-1], buffers[-1])
+                    finally:
+                        for buffer in buffers:
+                            buffer.release()
+        except (OSError, ValueError, KeyError):
+            return None
+
+        data_offsets = {}
+        try:
+            with open(path + '.offsets', 'rb') as f:
+                data_offsets = dict(_OffsetStruct.iter_unpack(f.read()))
+        except (OSError, ValueError):
+            pass
+
+        # Touching the file marks it as recently used, for eviction.
+        os.utime(path)
+
+        return CachedIndex(header['validators'], entries, data_offsets, header.get('cd_size', 0))
+
+    def store(self, url, validators, entries, *, cd_size=0):
+        os.makedirs(self.path, exist_ok=True)
+        path = self._index_path(url)
+
+        columns = entries.columns()
+        header = json.dumps({
+            'validators': validators,
+            'count': len(entries),
+            'cd_size': cd_size,
+            'columns': [len(column) * column.itemsize for column in columns]
+        }).encode()
+
+        # Written aside and then moved into place, so that a reader never sees half an index.
+        with open(path + '.tmp', 'wb') as f:
+            f.write(_MAGIC)
+            f.write(_HeaderSizeStruct.pack(len(header)))
+            f.write(header)
+            for column in columns:
+                column.tofile(f)
+            f.write(entries.paths)
+        os.replace(path + '.tmp', path)
+
+        # Offsets learned against an older version of the archive are meaningless now.
+        try:
+            os.remove(path + '.offsets')
+        except FileNotFoundError:
+            pass
+
+        self.evict()
+
+    def store_offsets(self, url, data_offsets):
+        if not data_offsets:
+            return
+
+        path = self._index_path(url)
+        if not os.path.exists(path):
+            return
+
+        with open(path + '.offsets', 'ab') as f:
+            f.write(b''.join(_OffsetStruct.pack(*item) for item in data_offsets.items()))
+
+    def evict(self):
+        indices = []
+        total = 0
+
+        for entry in os.scandir(self.path):
+            if not entry.name.endswith('.idx'):
+                continue
+
+            size = entry.stat().st_size
+            try:
+                size += os.stat(entry.path + '.offsets').st_size
+            except FileNotFoundError:
+                pass
+
+            indices.append((entry.stat().st_mtime, size, entry.path))
+            total += size
+
+        # Least recently used first
+        for _, size, path in sorted(indices):
+            if total <= self.max_size:
+                break
+
+            for victim in (path, path + '.offsets'):
+                try:
+                    os.remove(victim)
+                except FileNotFoundError:
+                    pass
+            total -= size
@@ -0,0 +1,123 @@
+import zlib
+
+from .entries import ZipCompression
+
+
+class _LZMADecompressor:
+    """LZMA in Zip files is a raw LZMA1 stream, preceded by a small header with its properties."""
+
+    def __init__(self):
+        self._decompressor = None
+        self._header = b''
+
+    def decompress(self, data):
+        if self._decompressor is None:
+            import lzma
+
+            self._header += data
+            if len(self._header) < 4:
+                return b''
+
+            props_size = int.from_bytes(self._header[2:4], byteorder='little')
+            if len(self._header) < 4 + props_size:
+                return b''
+
+            # NOTE The properties are those of LZMA1: lc, lp and pb packed in the first byte,
+            # then the dictionary size; parsed here as `lzma' only takes them as a filter.
+            props = self._header[4:4 + props_size]
+            d = props[0]
+            lc, d = d % 9, d // 9
+            lp, pb = d % 5, d // 5
+            self._decompressor = lzma.LZMADecompressor(lzma.FORMAT_RAW, filters=[{
+                'id': lzma.FILTER_LZMA1,
+                'dict_size': int.from_bytes(props[1:5], byteorder='little'),
+                'lc': lc, 'lp': lp, 'pb': pb
+            }])
+            data = self._header[4 + props_size:]
+
+        return self._decompressor.decompress(data)
+
+
+def make_decompressor(method):
+    # NOTE Codecs other than DEFLATE are imported only when needed, since they're slow to
+    # import and seldom used.
+    match method:
+        case ZipCompression.NONE:
+            return None
+        case ZipCompression.DEFLATE:
+            # Negative value for raw DEFLATE
+            return zlib.decompressobj(-15)
+        case ZipCompression.BZIP2:
+            import bz2
+            return bz2.BZ2Decompressor()
+        case ZipCompression.LZMA:
+            return _LZMADecompressor()
+        case ZipCompression.ZSTANDARD:
+            import compression.zstd
+            return compression.zstd.ZstdDecompressor()
+        case _:
+            raise NotImplementedError
+
+
+def _gf2_times(matrix, vector):
+    total = 0
+    for row in matrix:
+        if not vector:
+            break
+        if vector & 1:
+            total ^= row
+        vector >>= 1
+
+    return total
+
+
+def crc32_combine(crc1, crc2, size2):
+    """CRC-32 of two pieces of data put together, from their own and the size of the second,
+    as zlib's crc32_combine(), which Python doesn't expose: the first CRC is run through
+    `size2' zero bytes, by squaring the operator for one zero bit, a power of two at a time."""
+    if size2 <= 0:
+        return crc1
+
+    # The operator for one zero bit, then two, then four.
+    odd = [0xEDB88320] + [1 << n for n in range(31)]
+    even = [_gf2_times(odd, row) for row in odd]
+    odd = [_gf2_times(even, row) for row in even]
+
+    # NOTE The first squaring gives the operator for a zero byte.
+    while size2:
+        even = [_gf2_times(odd, row) for row in odd]
+        if size2 & 1:
+            crc1 = _gf2_times(even, crc1)
+        size2 >>= 1
+        if not size2:
+            break
+
+        odd = [_gf2_times(even, row) for row in even]
+        if size2 & 1:
+            crc1 = _gf2_times(odd, crc1)
+        size2 >>= 1
+
+    return crc1 ^ crc2
+
+
+class Decoder:
+    """Decompresses an entry and computes its CRC-32 incrementally. It's meant to be
+    driven from a worker thread, one batch at a time; all of the codecs release the GIL."""
+
+    def __init__(self, method):
+        self.decompressor = make_decompressor(method)
+        self.crc = 0
+
+    def decode(self, data, final=False):
+        if self.decompressor:
+            # NOTE Decompressors of bzip2 and LZMA refuse any input past the end of their
+            # stream, even if empty, as the last batch may well be.
+            if data:
+                data = self.decompressor.decompress(data)
+
+            # NOTE Only zlib's decompressor has (or needs) a flush().
+            if final and hasattr(self.decompressor, 'flush'):
+                data += self.decompressor.flush()
+
+        self.crc = zlib.crc32(data, self.crc)
+        return data
@@ -0,0 +1,175 @@
+from array import array
+from itertools import accumulate
+from enum import Enum
+from dataclasses import dataclass
+
+
+class ZipCompression(Enum):
+    NONE = 0
+    DEFLATE = 8
+    BZIP2 = 12
+    LZMA = 14
+    ZSTANDARD = 93
+
+
+def parse_msdos_date(date, time):
+    # See: https://learn.microsoft.com/en-us/windows/win32/api/winbase/nf-winbase-dosdatetimetofiletime
+    # Microsoft was retarded from its early days.
+    year = (date >> 9) + 1980
+    month = date >> 5 & 0xF
+    day = date & 0x1F
+    hour = time >> 11
+    minute = time >> 5 & 0x3F
+    second = time & 0x1F
+
+    return year, month, day, hour, minute, second * 2
+
+
+def decode_path(raw_path, bitflag):
+    # TODO Consider "UPath" extra field for completeness sake
+    if bitflag & 0b10000000000:
+        return raw_path.decode('utf-8', errors='replace')
+    else:
+        return raw_path.decode('cp437')
+
+
+@dataclass(slots=True)
+class ZipEntryInfo:
+    path: str
+    raw_offset: int
+    file_size: int
+    encrypted: int
+    checksum: int
+    compression: ZipCompression
+    compressed_size: int
+    dos_date: int
+    dos_time: int
+    internal_attrs: int
+    external_attrs: int
+    path_size: int = 0
+    extra_size: int = 0
+
+    @property
+    def modified_date(self):
+        return parse_msdos_date(self.dos_date, self.dos_time)
+
+    @property
+    def is_dir(self):
+        return self.path.endswith('/')
+
+
+class EntryTable:
+    """Entries of an archive, stored column-wise in arrays rather than one object per
+    entry. Paths are kept undecoded in a single blob; `ZipEntryInfo' objects are only
+    materialized when an entry is accessed."""
+
+    _COLUMNS = (
+        ('raw_offset', 'Q'),
+        ('file_size', 'Q'),
+        ('compressed_size', 'Q'),
+        ('checksum', 'I'),
+        ('external_attrs', 'I'),
+        ('bitflag', 'H'),
+        ('compression', 'H'),
+        ('dos_date', 'H'),
+        ('dos_time', 'H'),
+        ('internal_attrs', 'H'),
+        ('path_size', 'H'),
+        ('extra_size', 'H'),
+    )
+
+    def __init__(self):
+        for name, typecode in self._COLUMNS:
+            setattr(self, name, array(typecode))
+
+        self.paths = bytearray()
+        self.path_offsets = array('Q', [0])
+
+    def __len__(self):
+        return len(self.raw_offset)
+
+    def append(self, raw_path, *, raw_offset, file_size, compressed_size, checksum,
+               external_attrs, bitflag, compression, dos_date, dos_time, internal_attrs,
+               extra_size):
+        self.raw_offset.append(raw_offset)
+        self.file_size.append(file_size)
+        self.compressed_size.append(compressed_size)
+        self.checksum.append(checksum)
+        self.external_attrs.append(external_attrs)
+        self.bitflag.append(bitflag)
+        self.compression.append(compression)
+        self.dos_date.append(dos_date)
+        self.dos_time.append(dos_time)
+        self.internal_attrs.append(internal_attrs)
+        self.path_size.append(len(raw_path))
+        self.extra_size.append(extra_size)
+
+        self.paths += raw_path
+        self.path_offsets.append(len(self.paths))
+
+    def extend(self, columns, paths):
+        """Append entries in bulk: `columns' maps the names of `_COLUMNS' to arrays of their
+        values, and `paths' is their raw paths joined."""
+        for name, _ in self._COLUMNS:
+            getattr(self, name).extend(columns[name])
+
+        offsets = accumulate(columns['path_size'], initial=len(self.paths))
+        next(offsets)
+        self.path_offsets.extend(offsets)
+        self.paths += paths
+
+    def raw_path(self, i):
+        return bytes(self.paths[self.path_offsets[i]:self.path_offsets[i + 1]])
+
+    def path(self, i):
+        return decode_path(self.raw_path(i), self.bitflag[i])
+
+    def _entry(self, i):
+        return ZipEntryInfo(path=self.path(i),
+                            raw_offset=self.raw_offset[i],
+                            file_size=self.file_size[i],
+                            encrypted=bool(self.bitflag[i] & 1),
+                            checksum=self.checksum[i],
+                            compression=ZipCompression(self.compression[i]),
+                            compressed_size=self.compressed_size[i],
+                            dos_date=self.dos_date[i],
+                            dos_time=self.dos_time[i],
+                            internal_attrs=self.internal_attrs[i],
+                            external_attrs=self.external_attrs[i],
+                            path_size=self.path_size[i],
+                            extra_size=self.extra_size[i])
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self._entry(i) for i in range(*key.indices(len(self)))]
+
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("Entry index out of range")
+
+        return self._entry(key)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._entry(i)
+
+    def columns(self):
+        """All the arrays backing the table, in a fixed order."""
+        return [getattr(self, name) for name, _ in self._COLUMNS] + [self.path_offsets]
+
+    @classmethod
+    def from_buffers(cls, count, buffers, paths):
+        """Rebuild a table from the buffers of its `columns()' and the paths blob."""
+        table = cls()
+        for column, buffer in zip(table.columns(), buffers):
+            column.frombytes(buffer)
+
+        # The initial zero offset is part of the buffers too.
+        del table.path_offsets[0]
+        table.paths[:] = paths
+
+        if len(table) != count or len(table.path_offsets) != count + 1:
+            raise ValueError("Corrupt entry table")
+
+        return table
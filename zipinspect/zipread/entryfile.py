@@ -0,0 +1,143 @@
+import io
+import asyncio
+
+from bisect import bisect_right
+from operator import itemgetter
+
+from .codecs import make_decompressor
+from .entries import ZipCompression
+
+# Decompressing up to this much output is the most a seek costs, once checkpoints are made.
+DEFAULT_CHECKPOINT_INTERVAL = 8 * 1024 * 1024
+
+
+class EntryFile:
+    """Random access to an entry, as an async file-like object.
+
+    Stored entries are read with range requests right at the requested offset. Compressed
+    entries have to be decompressed from their start; for DEFLATE, though, a copy of the
+    decompressor is saved every `interval' bytes of output as it proceeds, so that a later
+    seek resumes from the nearest checkpoint before it, with a range request from there."""
+
+    def __init__(self, reader, info, *, interval=DEFAULT_CHECKPOINT_INTERVAL):
+        self.info = info
+        self.interval = interval
+        self.pos = 0
+        self._reader = reader
+        self._data_offset = None
+        # (uncompressed offset, compressed offset, decompressor or None if at the start),
+        # shared by all files of an entry opened by the same reader.
+        self._checkpoints = reader.checkpoints.setdefault(info.raw_offset, [(0, 0, None)])
+        self._chunks = None
+        self._decompressor = None
+        # Compressed bytes fed to the decompressor so far, and the offset of its buffered output.
+        self._cpos = 0
+        self._upos = 0
+        self._buf = bytearray()
+
+    @property
+    def size(self):
+        return self.info.file_size
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        match whence:
+            case io.SEEK_SET:
+                pos = offset
+            case io.SEEK_CUR:
+                pos = self.pos + offset
+            case io.SEEK_END:
+                pos = self.size + offset
+            case _:
+                raise ValueError(f"Invalid whence {whence}")
+
+        if pos < 0:
+            raise ValueError(f"Negative seek position {pos}")
+
+        self.pos = pos
+        return pos
+
+    async def read(self, n=-1):
+        end = self.size if n < 0 else min(self.pos + n, self.size)
+        if self.pos >= end:
+            return b''
+
+        if self._data_offset is None:
+            self._data_offset = await self._reader._calc_data_offset(self.info.raw_offset)
+
+        if self.info.compression == ZipCompression.NONE:
+            data = await self._reader._read(self._data_offset + self.pos, self._data_offset + end)
+        else:
+            data = await self._read_compressed(end)
+
+        self.pos += len(data)
+        return data
+
+    async def _restore(self, upos, cpos, decompressor):
+        await self._close_chunks()
+
+        # NOTE The checkpoint is copied again, so that it stays usable for later seeks.
+        self._decompressor = decompressor.copy() if decompressor else make_decompressor(self.info.compression)
+        self._chunks = self._reader._stream(self._data_offset + cpos,
+                                            self._data_offset + self.info.compressed_size)
+        self._cpos = cpos
+        self._upos = upos
+        self._buf.clear()
+
+    def _checkpoint(self):
+        head = self._upos + len(self._buf)
+
+        # Only zlib's decompressor can be copied; others have just the one at the start.
+        if (hasattr(self._decompressor, 'copy') and self._cpos < self.info.compressed_size
+                and head - self._checkpoints[-1][0] >= self.interval):
+            self._checkpoints.append((head, self._cpos, self._decompressor.copy()))
+
+    async def _read_compressed(self, end):
+        checkpoint = self._checkpoints[bisect_right(self._checkpoints, self.pos, key=itemgetter(0)) - 1]
+
+        # Decoding carries on from where it is, unless it's past the position, or short of a
+        # checkpoint that is closer.
+        head = self._upos + len(self._buf)
+        if not (self._decompressor and self._upos <= self.pos and head >= checkpoint[0]):
+            await self._restore(*checkpoint)
+
+        loop = asyncio.get_running_loop()
+        while self._upos + len(self._buf) < end:
+            if (chunk := await anext(self._chunks, None)) is None:
+                raise EOFError(f"Unexpected end of data of {self.info.path}")
+
+            data = await loop.run_in_executor(self._reader.executor, self._decompressor.decompress, chunk)
+            self._cpos += len(chunk)
+            if self._cpos >= self.info.compressed_size and hasattr(self._decompressor, 'flush'):
+                data += self._decompressor.flush()
+
+            self._buf += data
+            self._checkpoint()
+
+            # Output before the position is of no use.
+            if (drop := min(self.pos - self._upos, len(self._buf))) > 0:
+                del self._buf[:drop]
+                self._upos += drop
+
+        data = bytes(self._buf[self.pos - self._upos:end - self._upos])
+        del self._buf[:end - self._upos]
+        self._upos = end
+
+        return data
+
+    async def _close_chunks(self):
+        if self._chunks is not None:
+            await self._chunks.aclose()
+        self._chunks = None
+
+    async def aclose(self):
+        await self._close_chunks()
+        self._decompressor = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
@@ -0,0 +1,576 @@
+import time
+import asyncio
+
+import httpx
+
+from contextlib import aclosing
+
+from . import ZipReader, HTTPError, DEFAULT_TAIL_SIZE
+from .streams import RangeReader
+from .cache import IndexCache
+from .blocks import BlockCache
+from .sources import SourceScheduler
+from .stats import TransferStats
+
+# The tail is read whole before it's parsed, unlike the rest of the central directory, which
+# is streamed; so it's grown to fit a central directory of about the size last seen only
+# up to this size.
+MAX_TAIL_SIZE = 1024 * 1024
+# Transient errors in a row that a stream is retried for, on top of trying every source once.
+STREAM_RETRIES = 3
+# Seconds to wait before retrying, when no source is ready to be retried yet.
+RETRY_DELAY = 1.0
+
+
+class HTTPZipReader(ZipReader):
+    """Reader of a Zip file over HTTP, by range requests. Requests go to the fastest of the
+    mirrors of the file, if it has any, and are hedged and retried there; neighbouring spans
+    are fetched with multi-range requests, and fetched blocks kept in a `BlockCache', if
+    one's given."""
+
+    def __init__(self, url: str | list[str], *, httpx_args=None, cache: IndexCache = None,
+                 blocks: BlockCache = None, background=False, tail_size=DEFAULT_TAIL_SIZE,
+                 executor=None, client=None, stats: TransferStats = None):
+        # NOTE Several URLs may be given for mirrors of the same file; the first one identifies
+        # the archive, for caching, and is the one its validators are taken from. Mirrors are
+        # only used once they are found to serve the same file.
+        urls = [url] if isinstance(url, str) else list(url)
+        super().__init__(urls[0], cache=cache, background=background, tail_size=tail_size,
+                         executor=executor, stats=stats)
+
+        self.mirrors = urls[1:]
+        self.sources = SourceScheduler(urls[:1])
+        self._prober = None
+        self.blocks = blocks
+        # Whether the server answers multi-range requests; unknown until tried.
+        self.multipart = None
+        # NOTE A client that was given may well be shared, and is left for its owner to close.
+        self._owns_client = client is None
+        self.client = client or httpx.AsyncClient(follow_redirects=True, http2=True, **(httpx_args or {}))
+
+    async def _send(self, source, *, stream, httpx_args):
+        request = self.client.build_request('GET', source.url, **httpx_args)
+        started = time.monotonic()
+
+        try:
+            r = await self.client.send(request, stream=stream)
+        except httpx.TransportError:
+            source.record_failure()
+            raise
+        except asyncio.CancelledError:
+            # Losing a race tells at least that much about its latency.
+            source.record_latency(time.monotonic() - started)
+            raise
+
+        if r.status_code != 206:
+            await r.aclose()
+            source.record_failure()
+            raise HTTPError(f"Got status code {r.status_code} for {source.url}", r.status_code)
+
+        source.record_latency(time.monotonic() - started)
+        self.stats.record_request('range', source.url, time.monotonic() - started)
+        return r
+
+    async def _request(self, start, end=None, *, stream=False, httpx_args=None):
+        """Request a range from the best of the sources; returns it along with the response.
+        Should the response be late, the request is hedged with another source, and should
+        it fail, the next best source is tried."""
+        if httpx_args is None:
+            httpx_args = {}
+        if start < 0:
+            raise ValueError(f"Range can't beginning with {start}; clamping.")
+        if end is None:
+            end = self.size
+        if start >= end:
+            raise ValueError(f"Invalid range {start}-{end}")
+
+        httpx_args = httpx_args or {}
+        headers = httpx_args.setdefault('headers', {})
+        headers['Range'] = f'bytes={int(start)}-{int(end) - 1}'
+
+        tried = []
+        attempts = {}
+        error = None
+
+        def attempt(source):
+            # NOTE The range counts as in flight from the start, so that concurrent requests
+            # are spread over the sources; the caller accounts for it once it has a response.
+            source.inflight += end - start
+            tried.append(source)
+            attempts[asyncio.create_task(self._send(source, stream=stream, httpx_args=httpx_args))] = source
+
+        try:
+            while True:
+                if not attempts:
+                    if (source := self.sources.pick(end - start, exclude=tried)) is None:
+                        raise error
+                    attempt(source)
+
+                hedge = len(tried) < len(self.sources)
+                done, _ = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED,
+                                             timeout=self.sources.hedge_delay(tried[-1]) if hedge else None)
+
+                if not done:
+                    attempt(self.sources.pick(end - start, exclude=tried))
+                    continue
+
+                for task in done:
+                    source = attempts.pop(task)
+                    try:
+                        return source, task.result()
+                    except (httpx.TransportError, HTTPError) as e:
+                        source.inflight -= end - start
+                        error = e
+        finally:
+            for task, source in attempts.items():
+                source.inflight -= end - start
+                task.cancel()
+            # NOTE A duplicate may have made it anyway, and then its response has to be closed.
+            for r in await asyncio.gather(*attempts, return_exceptions=True):
+                if isinstance(r, httpx.Response):
+                    await r.aclose()
+
+    async def _stream_uncached(self, start, end):
+        """Stream a range from the sources. A source that fails or stalls in the middle of it
+        is left for another one, and transient errors are retried, for the rest of the range
+        from where it broke off."""
+        retries = len(self.sources) - 1 + STREAM_RETRIES
+
+        while start < end:
+            try:
+                source, r = await self._request(start, end, stream=True)
+            except (httpx.TransportError, HTTPError) as e:
+                if retries <= 0 or isinstance(e, HTTPError) and not e.transient:
+                    raise
+                retries -= 1
+                await self._retry_delay()
+                continue
+
+            received = 0
+            waited = 0.0
+
+            try:
+                chunks = r.aiter_bytes()
+                while True:
+                    started = time.monotonic()
+                    try:
+                        if len(self.sources) > 1:
+                            chunk = await asyncio.wait_for(anext(chunks, None), self.sources.stall_timeout(source))
+                        else:
+                            chunk = await anext(chunks, None)
+                    except (httpx.TransportError, TimeoutError):
+                        source.record_failure()
+                        if retries <= 0:
+                            raise
+                        retries -= 1
+                        break
+                    finally:
+                        waited += time.monotonic() - started
+
+                    if chunk is None:
+                        # NOTE Whoever reads the stream deals with it ending prematurely.
+                        source.failures = 0
+                        return
+
+                    self.stats.record_bytes(len(chunk))
+                    received += len(chunk)
+                    start += len(chunk)
+                    source.inflight -= len(chunk)
+                    yield chunk
+            finally:
+                source.inflight -= end - start
+                source.record_transfer(received, waited)
+                self.stats.record_phase('download', waited)
+                await r.aclose()
+
+            # NOTE Only errors in a row without progress in between count towards giving up.
+            if received:
+                retries = len(self.sources) - 1 + STREAM_RETRIES
+            await self._retry_delay()
+
+    async def _retry_delay(self):
+        if not any(source.healthy for source in self.sources):
+            await asyncio.sleep(RETRY_DELAY)
+
+    @property
+    def _block_key(self):
+        return (self.url, self.validators['etag'], self.validators['last_modified'],
+                self.validators['content_length'])
+
+    async def _stream(self, start, end=None):
+        """Stream a range of the file. With a block cache, cached blocks are served locally,
+        and only the runs of missing blocks in between are requested."""
+        if end is None:
+            end = self.size
+        # NOTE Until the archive is identified by its validators, nothing can be cached.
+        if self.blocks is None or self.validators is None:
+            async for chunk in self._stream_uncached(start, end):
+                yield chunk
+            return
+
+        if start >= end:
+            raise ValueError(f"Invalid range {start}-{end}")
+
+        key = self._block_key
+        block_size = self.blocks.block_size
+        index = start // block_size
+        last = (end - 1) // block_size
+
+        while index <= last:
+            if (data := self.blocks.get(key, index)) is not None:
+                base = index * block_size
+                yield data[max(start - base, 0):end - base]
+                index += 1
+                continue
+
+            stop = index + 1
+            while stop <= last and (key, stop) not in self.blocks:
+                stop += 1
+
+            # Requests are widened to whole blocks, so that all of it can be cached.
+            fetched = index * block_size
+            buffer = bytearray()
+            async with aclosing(self._stream_uncached(fetched, min(stop * block_size, self.size))) as chunks:
+                async for chunk in chunks:
+                    buffer += chunk
+                    while len(buffer) >= block_size:
+                        data = bytes(buffer[:block_size])
+                        del buffer[:block_size]
+                        self.blocks.put(key, fetched // block_size, data)
+                        yield data[max(start - fetched, 0):end - fetched]
+                        fetched += block_size
+
+            # The last block of the file is shorter.
+            if buffer:
+                data = bytes(buffer)
+                self.blocks.put(key, fetched // block_size, data)
+                yield data[max(start - fetched, 0):end - fetched]
+
+            index = stop
+
+    def _covers(self, start, end):
+        """Whether all of a range is cached."""
+        return self.blocks is not None and self.blocks.covers(self._block_key, start, end)
+
+    def _widen(self, start, end):
+        """A range widened to whole blocks, if there's a block cache, so that all of it can
+        be cached once it's fetched."""
+        if self.blocks is None:
+            return start, end
+
+        block_size = self.blocks.block_size
+        return start - start % block_size, min(-(-end // block_size) * block_size, self.size)
+
+    def _cache_range(self, start, data):
+        """Cache the whole blocks within some data of the file; returns the offset up to
+        which the data is of no more use for that."""
+        end = start + len(data)
+        if self.blocks is None:
+            return end
+
+        key = self._block_key
+        block_size = self.blocks.block_size
+        index = -(-start // block_size)
+
+        while index * block_size < self.size:
+            block_end = min((index + 1) * block_size, self.size)
+            if block_end > end:
+                break
+
+            self.blocks.put(key, index, data[index * block_size - start:block_end - start])
+            index += 1
+
+        return min(index * block_size, end)
+
+    async def _tee(self, start, chunks, *, drain=False):
+        """Pass chunks of the file through, caching the whole blocks among them. With `drain',
+        whatever is left of them once this is closed is read through as well, to be cached."""
+        buffer = bytearray()
+        pos = start
+
+        def cache(chunk):
+            nonlocal pos
+            buffer.extend(chunk)
+            consumed = self._cache_range(pos, buffer)
+            del buffer[:consumed - pos]
+            pos = consumed
+
+        try:
+            async for chunk in chunks:
+                if self.blocks is not None:
+                    cache(chunk)
+                yield chunk
+        except GeneratorExit:
+            # NOTE Unless it's cut short, that is.
+            if drain and self.blocks is not None and not asyncio.current_task().cancelling():
+                async for chunk in chunks:
+                    cache(chunk)
+            raise
+
+    async def _request_ranges(self, ranges):
+        """Request several ranges at once from the best of the sources. Transport and server
+        errors are retried as they are for a single range; see `_stream_uncached'."""
+        spec = ','.join(f'{int(start)}-{int(end) - 1}' for start, end in ranges)
+        size = sum(end - start for start, end in ranges)
+        retries = len(self.sources) - 1 + STREAM_RETRIES
+
+        while True:
+            source = self.sources.pick(size)
+            request = self.client.build_request('GET', source.url, headers={'Range': f'bytes={spec}'})
+
+            started = time.monotonic()
+            try:
+                r = await self.client.send(request, stream=True)
+            except httpx.TransportError:
+                source.record_failure()
+                if retries <= 0:
+                    raise
+            else:
+                if r.status_code < 500:
+                    source.record_latency(time.monotonic() - started)
+                    self.stats.record_request('multirange', source.url, time.monotonic() - started)
+                    return r
+
+                await r.aclose()
+                source.record_failure()
+                if retries <= 0:
+                    raise HTTPError(f"Got status code {r.status_code} for {source.url}", r.status_code)
+
+            retries -= 1
+            await self._retry_delay()
+
+    async def _received(self, chunks):
+        """Pass chunks of a response through, counting them."""
+        while True:
+            started = time.perf_counter()
+            chunk = await anext(chunks, None)
+            self.stats.record_phase('download', time.perf_counter() - started)
+
+            if chunk is None:
+                return
+
+            self.stats.record_bytes(len(chunk))
+            yield chunk
+
+    @staticmethod
+    def _parse_content_range(value):
+        # e.g. "bytes 0-499/1234"
+        unit, _, spec = value.partition(' ')
+        if unit != 'bytes':
+            raise HTTPError(f"Unsupported range unit {unit!r}")
+
+        first, _, last = spec.partition('/')[0].partition('-')
+        return int(first), int(last) + 1
+
+    async def _request_tail(self, n, *, headers=None):
+        headers = dict(headers or {})
+        headers['Range'] = f'bytes=-{int(n)}'
+
+        request = self.client.build_request('GET', self.url, headers=headers)
+        started = time.monotonic()
+        r = await self.client.send(request, stream=True)
+        self.stats.record_request('tail', self.url, time.monotonic() - started)
+
+        # NOTE Never download the whole file just because the server ignored our range.
+        if r.status_code not in (206, 304):
+            await r.aclose()
+
+            if r.status_code == 200:
+                raise HTTPError(f"Range requests not supported on {self.url}")
+            raise HTTPError(f"Got status code {r.status_code} for {self.url}", r.status_code)
+
+        self.stats.record_bytes(len(await r.aread()))
+        return r
+
+    async def load_entries(self, *, background=False):
+        """Load the entries of the archive. In the background mode, this returns as soon
+        as the central directory is located, and `entries' fills up as it is parsed."""
+        if self.entries is not None:
+            return
+
+        cached = None
+        headers = {}
+        tail_size = self.tail_size
+        if self.cache:
+            cached = self.cache.load(self.url)
+        if cached:
+            if etag := cached.validators.get('etag'):
+                headers['If-None-Match'] = etag
+            if last_modified := cached.validators.get('last_modified'):
+                headers['If-Modified-Since'] = last_modified
+
+            # Should the archive have changed, its central directory is likely of a similar size.
+            tail_size = max(tail_size, min(cached.cd_size + tail_size, MAX_TAIL_SIZE))
+
+        # NOTE A single suffix range request both tells the size of the file, and likely contains
+        # the EOCD, EOCD64 and the central directory altogether.
+        with self.stats.phase('tail'):
+            r = await self._request_tail(tail_size, headers=headers)
+
+        # NOTE Some servers ignore conditional requests, so validators are compared as well.
+        if cached and (r.status_code == 304 or
+                       self._parse_validators(r.headers) == cached.validators):
+            self.validators = cached.validators
+            self._probe_mirrors()
+            self.size = cached.validators['content_length']
+            self._load_cached(cached)
+            return
+
+        if r.status_code != 206 or 'Content-Range' not in r.headers:
+            raise HTTPError(f"Got status code {r.status_code} for {self.url}", r.status_code)
+
+        tail = r.content
+        self.size = int(r.headers['Content-Range'].rpartition('/')[2])
+        self.validators = self._parse_validators(r.headers)
+        self._probe_mirrors()
+        tail_start = self.size - len(tail)
+        self._cache_range(tail_start, tail)
+
+        await self._load_tail(tail, tail_start, background=background)
+
+    async def _probe(self, url):
+        request = self.client.build_request('GET', url, headers={'Range': 'bytes=-1'})
+        started = time.monotonic()
+        r = await self.client.send(request)
+        self.stats.record_request('probe', url, time.monotonic() - started)
+
+        probed = self._parse_validators(r.headers)
+        # NOTE Different servers may well tag the same file differently, so an ETag is only
+        # compared if both have one; a mismatch in size is certain, though.
+        if (r.status_code == 206 and probed['content_length'] == self.validators['content_length']
+                and not (probed['etag'] and self.validators['etag'] and probed['etag'] != self.validators['etag'])):
+            self.sources.add(url)
+
+    def _probe_mirrors(self):
+        """Add the mirrors serving the same file as the first URL to the sources, as they
+        are found to, in the background."""
+        if self.mirrors:
+            self._prober = asyncio.ensure_future(self._probe_all())
+
+    async def _probe_all(self):
+        # NOTE The exceptions are gathered, or those of the probes failing after the first one
+        # would never be retrieved; a mirror whose probe fails is dropped altogether.
+        results = await asyncio.gather(*(self._probe(url) for url in self.mirrors), return_exceptions=True)
+        self.mirrors = [url for url, result in zip(self.mirrors, results)
+                        if not isinstance(result, Exception)]
+
+    @property
+    def max_streams(self):
+        """Concurrent requests the server takes over a connection, if told by HTTP/2."""
+        # NOTE httpx doesn't expose it, so this digs into httpcore, giving up if that changes.
+        try:
+            for connection in self.client._transport._pool.connections:
+                if h2_state := getattr(connection._connection, '_h2_state', None):
+                    return h2_state.remote_settings.max_concurrent_streams
+        except AttributeError:
+            pass
+
+        return None
+
+    @staticmethod
+    def _parse_validators(headers):
+        content_range = headers.get('Content-Range', '')
+
+        return {
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'content_length': int(content_range.rpartition('/')[2] or 0)
+        }
+
+    async def _iter_parts(self, r):
+        """Iterate over parts of a multipart/byteranges response as (start, end, reader)."""
+        _, _, boundary = r.headers['Content-Type'].partition('boundary=')
+        delimiter = b'--' + boundary.strip('"').encode()
+
+        body = RangeReader(self._received(r.aiter_bytes()))
+        while True:
+            line = (await body.readline()).strip()
+            if line == delimiter + b'--':
+                break
+            if line != delimiter:
+                continue  # Preamble, or the CRLF preceding a delimiter.
+
+            headers = {}
+            while line := (await body.readline()).strip():
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            start, end = self._parse_content_range(headers['content-range'])
+            part_end = body.pos + (end - start)
+
+            # NOTE The rest of a part is read anyway, so it's cached too, rather than just skipped.
+            reader = RangeReader(self._tee(start, body.chunks(end - start), drain=True), start, fetch=self._stream)
+            yield start, end, reader
+            # Whatever the consumer did not read of this part is discarded.
+            await body.skip(part_end - body.pos)
+
+    async def _iter_single_part(self, r):
+        start, end = self._parse_content_range(r.headers['Content-Range'])
+        yield start, end, RangeReader(self._tee(start, self._received(r.aiter_bytes())), start, fetch=self._stream)
+
+    async def extract_spans(self, spans, open_output, *, raw=False):
+        """Extract entries of several spans, with a single multi-range request if
+        the server supports it; otherwise one request per span."""
+        pending = sorted(spans, key=lambda span: span.start)
+
+        # Spans that are cached already are served separately, without requesting them again.
+        if self.blocks is not None:
+            cached = [span for span in pending if self._covers(span.start, span.end)]
+            pending = [span for span in pending if span not in cached]
+
+            for span in cached:
+                async for processed in self.extract_span(span, open_output, raw=raw):
+                    yield processed
+
+        if len(pending) > 1 and self.multipart is not False:
+            # NOTE Parts are widened to whole blocks, as ranges streamed are, or else none of
+            # them would be cached; ranges that meet once widened are merged.
+            ranges = []
+            for span in pending:
+                start, end = self._widen(span.start, span.end)
+                if ranges and start <= ranges[-1][1]:
+                    ranges[-1] = ranges[-1][0], max(ranges[-1][1], end)
+                else:
+                    ranges.append((start, end))
+
+            r = await self._request_ranges(ranges)
+
+            try:
+                if r.status_code == 206:
+                    if r.headers.get('Content-Type', '').startswith('multipart/byteranges'):
+                        self.multipart = True
+                        parts = self._iter_parts(r)
+                    else:
+                        # The server coalesced the ranges into one.
+                        parts = self._iter_single_part(r)
+
+                    async with aclosing(parts):
+                        async for start, end, reader in parts:
+                            covered = [span for span in pending if start <= span.start < end]
+                            pending = [span for span in pending if not start <= span.start < end]
+
+                            async with aclosing(reader):
+                                for span in covered:
+                                    async for processed in self._extract_span_from(reader, span, open_output, raw):
+                                        yield processed
+                elif r.status_code in (200, 416):
+                    # NOTE Never download the whole file just because the server ignored our ranges;
+                    # nor ask again, once it refused them. Anything else may well be transient, and
+                    # is left for the requests per span to deal with.
+                    self.multipart = False
+            finally:
+                await r.aclose()
+
+        # Spans that weren't covered by the response, if any.
+        async for processed in super().extract_spans(pending, open_output, raw=raw):
+            yield processed
+
+    async def __aexit__(self, *args):
+        if self._prober is not None and not self._prober.done():
+            self._prober.cancel()
+
+        try:
+            await super().__aexit__(*args)
+        finally:
+            if self._owns_client:
+                await self.client.aclose()
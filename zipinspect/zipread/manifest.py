@@ -0,0 +1,65 @@
+import os
+import json
+
+from ..utils.files import file_crc32
+
+MANIFEST_NAME = '.zipinspect-manifest.json'
+
+
+def entry_record(info):
+    """What an extracted entry is recognized by, should the archive be updated since."""
+    return {'checksum': info.checksum, 'file_size': info.file_size,
+            'modified': list(info.modified_date)}
+
+
+class Manifest:
+    """Entries extracted into a directory, by path, as they were in the archive; kept in a
+    file in the directory, so that syncing it with a newer version of the archive needs
+    only what changed to be downloaded.
+
+    A file is taken to be extracted already if its entry is recorded as it is now, and
+    the file is still of its size; with no record of it, its checksum has to match."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = {}
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    @classmethod
+    def load(cls, directory):
+        manifest = cls(directory)
+        try:
+            with open(manifest.path) as f:
+                manifest.files = json.load(f)['files']
+        except (OSError, ValueError, KeyError):
+            pass
+
+        return manifest
+
+    def unchanged(self, info, path):
+        """Whether the entry is extracted to `path' already, as it is now."""
+        try:
+            if os.path.getsize(path) != info.file_size:
+                return False
+        except OSError:
+            return False
+
+        if (record := self.files.get(info.path)) is not None:
+            return record == entry_record(info)
+
+        return file_crc32(path) == info.checksum
+
+    def record(self, info):
+        self.files[info.path] = entry_record(info)
+
+    def forget(self, path):
+        self.files.pop(path, None)
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump({'files': self.files}, f, ensure_ascii=False)
+        os.replace(self.path + '.tmp', self.path)
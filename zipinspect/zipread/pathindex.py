@@ -0,0 +1,105 @@
+import re
+import fnmatch
+
+from bisect import bisect_left
+
+
+def _prefix_end(prefix):
+    """The smallest string greater than all strings starting with `prefix'."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _dos_timestamp(date):
+    year, month, day, hour, minute, second = date
+    return ((year - 1980) << 9 | month << 5 | day) << 16 | (hour << 11 | minute << 5 | second // 2)
+
+
+class PathIndex:
+    """Entries of an `EntryTable' sorted by path, for looking up directories and selecting
+    entries by pattern without scanning the whole table."""
+
+    def __init__(self, entries):
+        self.entries = entries
+
+        paths = [entries.path(i) for i in range(len(entries))]
+        self.order = sorted(range(len(paths)), key=paths.__getitem__)
+        self.paths = [paths[i] for i in self.order]
+
+    def _range(self, prefix):
+        if not prefix:
+            return 0, len(self.paths)
+
+        return (bisect_left(self.paths, prefix),
+                bisect_left(self.paths, _prefix_end(prefix)))
+
+    def lookup(self, path):
+        """Index of the entry with exactly this path, or None."""
+        i = bisect_left(self.paths, path)
+        if i < len(self.paths) and self.paths[i] == path:
+            return self.order[i]
+
+    def subtree(self, prefix):
+        """Indices of all entries under a directory (or starting with a prefix), in path order."""
+        lo, hi = self._range(prefix)
+        return self.order[lo:hi]
+
+    def is_dir(self, path):
+        """Whether a directory exists, either as an entry or implied by the paths under it."""
+        if not path:
+            return True
+
+        lo, hi = self._range(path if path.endswith('/') else path + '/')
+        return lo < hi
+
+    def children(self, prefix):
+        """Names of the immediate children of a directory; subdirectories end with a slash.
+        Subdirectories are skipped over as a whole, so this doesn't scan their contents."""
+        lo, hi = self._range(prefix)
+
+        while lo < hi:
+            rest = self.paths[lo][len(prefix):]
+            name, slash, _ = rest.partition('/')
+
+            if slash:
+                yield name + '/'
+                lo = bisect_left(self.paths, _prefix_end(prefix + name + '/'), lo, hi)
+            else:
+                if name:
+                    yield name
+                lo += 1
+
+    def find(self, pattern=None, *, regex=False, min_size=None, max_size=None,
+             after=None, before=None):
+        """Indices of the entries matching a glob (or a regular expression) against their full
+        path, and optionally constrained by size and by modification date, given as tuples
+        like `ZipEntryInfo.modified_date'."""
+        prefix = ''
+        matcher = None
+        if pattern is not None and regex:
+            matcher = re.compile(pattern).search
+        elif pattern is not None:
+            # Anything before the first wildcard narrows down the range to search.
+            prefix = re.match(r'[^*?\[]*', pattern).group()
+            matcher = re.compile(fnmatch.translate(pattern)).match
+
+        after = _dos_timestamp(after) if after else None
+        before = _dos_timestamp(before) if before else None
+
+        lo, hi = self._range(prefix)
+        table = self.entries
+
+        for path, i in zip(self.paths[lo:hi], self.order[lo:hi]):
+            if matcher and not matcher(path):
+                continue
+            if min_size is not None and table.file_size[i] < min_size:
+                continue
+            if max_size is not None and table.file_size[i] > max_size:
+                continue
+            if after is not None or before is not None:
+                timestamp = table.dos_date[i] << 16 | table.dos_time[i]
+                if after is not None and timestamp < after:
+                    continue
+                if before is not None and timestamp >= before:
+                    continue
+
+            yield i
@@ -0,0 +1,105 @@
+from dataclasses import dataclass, field
+
+# Gaps smaller than this between two entries are cheaper to download and throw
+# away than to pay for another round trip.
+DEFAULT_MAX_GAP = 64 * 1024
+# Merged spans are capped, so that a batch is still spread over several requests.
+DEFAULT_MAX_SPAN = 16 * 1024 * 1024
+DEFAULT_MAX_RANGES = 16
+
+# The local extra field routinely differs from the central one (e.g. Info-ZIP's
+# extended timestamp, or Zip64 sizes), so the estimate is padded a bit.
+LFH_SLACK = 64
+
+
+def estimate_entry_size(info):
+    """Estimated size of the local header plus the data of an entry."""
+    return 30 + info.path_size + info.extra_size + LFH_SLACK + info.compressed_size
+
+
+@dataclass
+class RangeSpan:
+    start: int
+    end: int
+    entries: list = field(default_factory=list)
+
+    @property
+    def size(self):
+        return self.end - self.start
+
+
+def plan_ranges(infos, *, max_gap=DEFAULT_MAX_GAP, max_span=DEFAULT_MAX_SPAN, limit=None):
+    """Sort entries by offset and merge neighbours into spans, that could each be
+    fetched with a single range request."""
+    spans = []
+
+    for info in sorted(infos, key=lambda info: info.raw_offset):
+        start = info.raw_offset
+        end = start + estimate_entry_size(info)
+        if limit is not None:
+            end = min(end, limit)
+
+        # NOTE The gap could be negative, since the estimate may overshoot into the next entry.
+        if (spans and start - spans[-1].end <= max_gap
+                and end - spans[-1].start <= max_span):
+            spans[-1].end = max(spans[-1].end, end)
+            spans[-1].entries.append(info)
+        else:
+            spans.append(RangeSpan(start, end, [info]))
+
+    return spans
+
+
+def group_spans(spans, *, max_ranges=DEFAULT_MAX_RANGES, max_bytes=DEFAULT_MAX_SPAN):
+    """Group small spans together, to be fetched with a single multi-range request."""
+    groups = []
+
+    for span in spans:
+        if (groups and len(groups[-1]) < max_ranges
+                and sum(s.size for s in groups[-1]) + span.size <= max_bytes):
+            groups[-1].append(span)
+        else:
+            groups.append([span])
+
+    return groups
+
+
+def split_ranges(ranges, n):
+    """Split ranges into about `n' parts of about the same size altogether."""
+    total = sum(end - start for start, end in ranges)
+    part_size = max(-(-total // n), 1)
+
+    parts = []
+    for start, end in ranges:
+        while start < end:
+            parts.append((start, min(start + part_size, end)))
+            start = parts[-1][1]
+
+    return parts
+
+
+def content_key(info):
+    """What entries with the same contents have in common; the sizes and method make it
+    unlikelier still that a match is a CRC-32 collision."""
+    return info.checksum, info.file_size, info.compressed_size, info.compression
+
+
+def dedupe_entries(infos):
+    """Split entries into those of distinct contents, going by `content_key', and the rest,
+    as pairs of an entry and the one among the former that has the same contents. Empty
+    entries are never taken as duplicates; there's nothing to save on them."""
+    unique = []
+    duplicates = []
+    seen = {}
+
+    for info in infos:
+        if info.file_size:
+            key = content_key(info)
+            if (original := seen.get(key)) is not None:
+                duplicates.append((info, original))
+                continue
+            seen[key] = info
+
+        unique.append(info)
+
+    return unique, duplicates
@@ -0,0 +1,91 @@
+import asyncio
+
+import httpx
+
+from dataclasses import dataclass
+
+from . import DEFAULT_TAIL_SIZE
+from .httpreader import HTTPZipReader
+from .entries import EntryTable
+from .cache import IndexCache
+from .stats import TransferStats
+from ..utils.asyncio import drain_queue
+
+DEFAULT_CONCURRENCY = 64
+# Archives loaded from the same host at once, at most.
+DEFAULT_PER_HOST = 8
+
+
+@dataclass
+class Listing:
+    """Entries of an archive listed by an `ArchivePool', or why they couldn't be."""
+    url: str
+    entries: EntryTable = None
+    size: int = 0
+    error: Exception = None
+
+
+class ArchivePool:
+    """Lists the entries of many archives concurrently, over a single client, so that
+    connections (and TLS sessions) are shared by all archives of a host; with HTTP/2, they
+    are multiplexed over a single connection. A client may be given, otherwise one is made
+    and closed along with the pool.
+
+    No more than `concurrency' archives are loaded at once, and no more than `per_host' of
+    them from the same host. An archive that fails doesn't affect the others."""
+
+    def __init__(self, *, concurrency=DEFAULT_CONCURRENCY, per_host=DEFAULT_PER_HOST,
+                 client=None, httpx_args=None, cache: IndexCache = None,
+                 stats: TransferStats = None, tail_size=DEFAULT_TAIL_SIZE):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.cache = cache
+        self.stats = stats or TransferStats()
+        self.tail_size = tail_size
+        self._hosts = {}
+        self._owns_client = client is None
+        self.client = client or httpx.AsyncClient(
+            follow_redirects=True, http2=True,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            **(httpx_args or {}))
+
+    async def _list(self, url, slots, results):
+        try:
+            try:
+                host = httpx.URL(url).host
+                async with self._hosts.setdefault(host, asyncio.Semaphore(self.per_host)):
+                    async with HTTPZipReader(url, client=self.client, cache=self.cache,
+                                             stats=self.stats, tail_size=self.tail_size) as z:
+                        listing = Listing(url, z.entries, z.size)
+            except Exception as e:
+                listing = Listing(url, error=e)
+
+            await results.put(listing)
+        finally:
+            slots.release()
+
+    async def list(self, urls):
+        """Yield a `Listing' for each of `urls', an iterable, in the order they're loaded.
+        URLs are taken from it only as there's room for them."""
+        slots = asyncio.Semaphore(self.concurrency)
+        # NOTE A consumer that falls behind holds up loading, rather than listings piling up.
+        results = asyncio.Queue(maxsize=self.concurrency)
+
+        async def feed():
+            async with asyncio.TaskGroup() as tg:
+                for url in urls:
+                    await slots.acquire()
+                    tg.create_task(self._list(url, slots, results))
+
+        async for listing in drain_queue(results, [asyncio.create_task(feed())]):
+            yield listing
+
+    async def aclose(self):
+        if self._owns_client:
+            await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
@@ -0,0 +1,82 @@
+import os
+import mmap
+import asyncio
+
+from pathlib import Path
+from typing import Protocol, AsyncIterator
+
+# Ranges are handed out in views of this size at most.
+CHUNK_SIZE = 1024 * 1024
+
+
+class RangeSource(Protocol):
+    """Where a Zip file is read from, by ranges of bytes, for `SourceZipReader'. `url'
+    identifies the file, for caching, and `validators' tell whether it changed since, as
+    they do over HTTP.
+
+    Over HTTP, it's `HTTPZipReader' itself that does the requests, as it needs to for
+    mirrors, retries and multi-range requests."""
+    url: str
+    size: int
+    validators: dict
+
+    def stream(self, start: int, end: int) -> AsyncIterator[bytes]:
+        """Yield the bytes of a range, in chunks; these may be memoryviews."""
+        ...
+
+    def close(self):
+        ...
+
+
+class MemoryRangeSource:
+    """A Zip file held in memory, e.g. for tests; ranges of it are views, not copies."""
+
+    def __init__(self, data, url='memory:'):
+        self.url = url
+        self._view = memoryview(data)
+        self.size = len(self._view)
+        self.validators = {'etag': None, 'last_modified': None, 'content_length': self.size}
+
+    async def stream(self, start, end):
+        end = min(end, self.size)
+        while start < end:
+            yield self._view[start:min(start + CHUNK_SIZE, end)]
+            start += CHUNK_SIZE
+            # NOTE Nothing here ever waits, so the event loop is given a chance between chunks.
+            await asyncio.sleep(0)
+
+    def close(self):
+        self._view.release()
+
+
+class FileRangeSource(MemoryRangeSource):
+    """A local Zip file, mapped into memory. Parsing and extracting it copies nothing that
+    the decompressor or the output don't need to, and reading is left to the page cache;
+    the pages of a range are asked for ahead of time, as it's streamed."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            # NOTE An empty file can't be mapped; it's no Zip file either, as is found out later.
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else None
+
+        super().__init__(self._map if self._map is not None else b'', Path(path).resolve().as_uri())
+        self.validators['last_modified'] = str(st.st_mtime_ns)
+
+    async def stream(self, start, end):
+        end = min(end, self.size)
+        if self._map is not None and start < end and hasattr(mmap, 'MADV_WILLNEED'):
+            aligned = start - start % mmap.PAGESIZE
+            self._map.madvise(mmap.MADV_WILLNEED, aligned, end - aligned)
+
+        async for chunk in super().stream(start, end):
+            yield chunk
+
+    def close(self):
+        super().close()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # Views of it are still around; it's unmapped once they're gone.
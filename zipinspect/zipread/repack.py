@@ -0,0 +1,132 @@
+from struct import Struct
+
+_CDFHStruct = Struct('<4sHHHHHHIIIHHHHHII')
+_EOCDStruct = Struct('<4sHHHHII')
+_EOCD64Struct = Struct('<4sQHHIIQQQQ')
+_EOCD64LocatorStruct = Struct('<4sIQI')
+_DescriptorStruct = Struct('<4sIII')
+_Descriptor64Struct = Struct('<4sIQQ')
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+ZIP64_VERSION = 45
+# Unix, in the upper byte of `version made by'.
+UNIX_HOST = 3
+
+
+def _has_zip64_extra(extras):
+    offset = 0
+    while offset + 4 <= len(extras):
+        if extras[offset:offset + 2] == b'\x01\x00':
+            return True
+        offset += 4 + int.from_bytes(extras[offset + 2:offset + 4], byteorder='little')
+
+    return False
+
+
+class _RepackedEntry:
+    """Output of a single entry of a `ZipRepacker', as handed out by its `open'."""
+
+    def __init__(self, repacker, info):
+        self._repacker = repacker
+        self.info = info
+        self.offset = None
+        self.lfh = None
+        self.raw_path = None
+        self.zip64 = False
+
+    def write_header(self, lfh, header):
+        """Write the local header of the entry as it is; `lfh' holds its parsed fields."""
+        self.offset = self._repacker.pos
+        self.lfh = lfh
+        self.raw_path = header[30:30 + lfh.path_size]
+        self.zip64 = _has_zip64_extra(header[30 + lfh.path_size:])
+        self._repacker.write(header)
+
+    def write(self, data):
+        self._repacker.write(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is not None or self.lfh is None:
+            return
+
+        info = self.info
+        # NOTE The sizes follow the data, if the local header doesn't have them.
+        if self.lfh.bitflag & 0x08:
+            if self.zip64 or max(info.compressed_size, info.file_size) >= ZIP64_LIMIT:
+                descriptor = _Descriptor64Struct.pack(b'PK\x07\x08', info.checksum,
+                                                      info.compressed_size, info.file_size)
+            else:
+                descriptor = _DescriptorStruct.pack(b'PK\x07\x08', info.checksum,
+                                                    info.compressed_size, info.file_size)
+            self._repacker.write(descriptor)
+
+        self._repacker.entries.append(self)
+
+
+class ZipRepacker:
+    """Writes a Zip file to `f' out of entries of another, copied as they are: local headers
+    and compressed data alike. Only the central directory is built anew, with the offsets
+    of the entries in the new file, and Zip64 records wherever they're needed.
+
+    Entries are written one after another through the outputs handed out by `open'; the
+    central directory is written by `close'."""
+
+    def __init__(self, f):
+        self.f = f
+        self.pos = 0
+        self.entries = []
+
+    def open(self, info):
+        return _RepackedEntry(self, info)
+
+    def write(self, data):
+        self.f.write(data)
+        self.pos += len(data)
+
+    def _write_cdfh(self, entry):
+        info = entry.info
+        fields = [('file_size', info.file_size), ('compressed_size', info.compressed_size),
+                  ('offset', entry.offset)]
+
+        # NOTE Only the fields that overflow go into the Zip64 extra field, in this order.
+        zip64 = [value for _, value in fields if value >= ZIP64_LIMIT]
+        extra = b''
+        if zip64:
+            extra = b'\x01\x00' + (8 * len(zip64)).to_bytes(2, byteorder='little')
+            extra += b''.join(value.to_bytes(8, byteorder='little') for value in zip64)
+
+        file_size, compressed_size, offset = (min(value, ZIP64_LIMIT) for _, value in fields)
+        version = max(entry.lfh.version, ZIP64_VERSION) if zip64 else entry.lfh.version
+        # NOTE `Version made by' isn't kept; Unix modes in the upper half of the external
+        # attributes tell of an archive made on Unix, and they're only honoured as such.
+        host = UNIX_HOST if info.external_attrs >> 16 else 0
+
+        self.write(_CDFHStruct.pack(b'PK\x01\x02', host << 8 | version & 0xFF, version,
+                                    entry.lfh.bitflag, entry.lfh.compression_mode,
+                                    info.dos_time, info.dos_date, info.checksum,
+                                    compressed_size, file_size, len(entry.raw_path), len(extra),
+                                    0, 0, info.internal_attrs, info.external_attrs, offset))
+        self.write(entry.raw_path)
+        self.write(extra)
+
+    def close(self):
+        cd_offset = self.pos
+        for entry in self.entries:
+            self._write_cdfh(entry)
+        cd_size = self.pos - cd_offset
+
+        count = len(self.entries)
+        if count >= ZIP64_COUNT_LIMIT or cd_size >= ZIP64_LIMIT or cd_offset >= ZIP64_LIMIT:
+            eocd64_offset = self.pos
+            self.write(_EOCD64Struct.pack(b'PK\x06\x06', _EOCD64Struct.size - 12, ZIP64_VERSION,
+                                          ZIP64_VERSION, 0, 0, count, count, cd_size, cd_offset))
+            self.write(_EOCD64LocatorStruct.pack(b'PK\x06\x07', 0, eocd64_offset, 1))
+
+        self.write(_EOCDStruct.pack(b'PK\x05\x06', 0, 0, min(count, ZIP64_COUNT_LIMIT),
+                                    min(count, ZIP64_COUNT_LIMIT), min(cd_size, ZIP64_LIMIT),
+                                    min(cd_offset, ZIP64_LIMIT)))
+        self.write(b'\x00\x00')
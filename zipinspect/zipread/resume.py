@@ -0,0 +1,200 @@
+import os
+import json
+import asyncio
+
+from ..utils.writer import WriteBehindFile
+
+# State is saved after about this many bytes have been written since it last was, and
+# whenever extraction stops.
+SAVE_INTERVAL = 4 * 1024 * 1024
+# Spooled data is read back in chunks of this size.
+SPOOL_CHUNK_SIZE = 256 * 1024
+
+STATE_SUFFIX = '.zipinspect-state'
+SPOOL_SUFFIX = '.zipinspect-spool'
+
+
+def entry_identity(reader, info):
+    """What an interrupted extraction has to match to be resumed: the same entry of the
+    same archive, going by its validators."""
+    return {'url': reader.url, **(reader.validators or {}), 'raw_offset': info.raw_offset,
+            'checksum': info.checksum, 'compressed_size': info.compressed_size,
+            'file_size': info.file_size, 'compression': info.compression.value}
+
+
+class ResumeState:
+    """Progress of extracting an entry to `path', kept in a sidecar file next to it, so that
+    an extraction that was cut short is resumed instead of started over.
+
+    Stored entries are resumed from the ranges of the output already written. Compressed
+    entries can't be resumed halfway through, since a decompressor can't be saved to disk;
+    their compressed data is spooled to another sidecar file instead, as it arrives, so
+    that only what's missing from it is downloaded again, and the rest decompressed anew.
+
+    It's a context manager; the sidecar files are removed once extraction succeeds, and
+    the state is saved if it doesn't. If the output is written behind (see `WriteBehind'),
+    so are the spool and the state, after the writes it accounts for."""
+
+    def __init__(self, path, identity, *, spool=False):
+        self.path = path
+        self.identity = identity
+        # Ranges of the output that are written, merged and in order.
+        self.done = []
+        # Compressed bytes in the spool, if compressed data is spooled.
+        self.spooled = 0 if spool else None
+        self.output = None
+        self._spool = None
+        self._unsaved = 0
+
+    @classmethod
+    def open(cls, path, identity, *, spool=False):
+        """Pick up the state of an earlier extraction to `path', if it's of the same entry."""
+        state = cls(path, identity, spool=spool)
+        try:
+            with open(path + STATE_SUFFIX) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = None
+
+        if saved and saved['identity'] == identity:
+            # NOTE Whatever was written past the end of a file that got cut short is lost.
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            state.done = [(start, min(end, size)) for start, end in saved['done'] if start < size]
+
+            if spool and os.path.exists(path + SPOOL_SUFFIX):
+                state.spooled = min(saved['spooled'] or 0, os.path.getsize(path + SPOOL_SUFFIX))
+
+        if spool:
+            with open(path + SPOOL_SUFFIX, 'ab') as f:
+                f.truncate(state.spooled)
+            state._spool = open(path + SPOOL_SUFFIX, 'ab')
+
+        return state
+
+    @property
+    def done_size(self):
+        return sum(end - start for start, end in self.done)
+
+    def open_output(self, writer=None, size=None):
+        """Open the output for writing, without losing what's written already; with `writer',
+        it's written behind, and `size' is what it's going to be."""
+        if writer is not None:
+            self.output = writer.open(self.path, size, truncate=not self.done)
+            if self._spool is not None:
+                # NOTE The spool is written by the same thread as the output, so that the
+                # state is saved after both.
+                self._spool.close()
+                self._spool = writer.open(self.path + SPOOL_SUFFIX, truncate=False, beside=self.output)
+                self._spool.seek(self.spooled)
+        else:
+            self.output = open(self.path, 'r+b' if self.done else 'wb')
+        return self.output
+
+    def missing(self, size):
+        """Ranges of an output of `size' bytes that are not written yet."""
+        ranges = []
+        pos = 0
+        for start, end in self.done:
+            if pos < start:
+                ranges.append((pos, start))
+            pos = max(pos, end)
+        if pos < size:
+            ranges.append((pos, size))
+
+        return ranges
+
+    def record(self, start, end):
+        """Account for a range of the output having been written."""
+        n = end - start
+        done = []
+        for r in self.done:
+            # Ranges that overlap or touch the new one are merged into it.
+            if r[1] < start or end < r[0]:
+                done.append(r)
+            else:
+                start, end = min(start, r[0]), max(end, r[1])
+        done.append((start, end))
+        self.done = sorted(done)
+
+        self._written(n)
+
+    def spool(self, data):
+        """Append compressed data to the spool."""
+        self._spool.write(data)
+        self.spooled += len(data)
+        self._written(len(data))
+
+    async def spooled_chunks(self):
+        """Read back the compressed data spooled so far, in a worker thread."""
+        f = await asyncio.to_thread(open, self.path + SPOOL_SUFFIX, 'rb')
+        try:
+            remaining = self.spooled
+            while remaining > 0 and (chunk := await asyncio.to_thread(f.read, min(SPOOL_CHUNK_SIZE, remaining))):
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            f.close()
+
+    def reset(self):
+        """Forget all progress, e.g. when it turned out to be corrupt."""
+        self.done = []
+        if self._spool is not None:
+            # NOTE A spool written behind is cut down to size when it's opened next.
+            if isinstance(self._spool, WriteBehindFile):
+                self._spool.seek(0)
+            else:
+                self._spool.truncate(0)
+            self.spooled = 0
+
+    def _written(self, n):
+        self._unsaved += n
+        if self._unsaved >= SAVE_INTERVAL:
+            self.save()
+
+    def _after_output(self, fn):
+        """Call `fn' once what's been written to the output so far is handed to the OS."""
+        if isinstance(self.output, WriteBehindFile):
+            self.output.when_written(fn)
+            return
+
+        if self.output is not None and not self.output.closed:
+            self.output.flush()
+        fn()
+
+    def save(self):
+        # NOTE Written data has to be handed to the OS before it's recorded as such.
+        if self._spool is not None and not getattr(self._spool, 'closed', False):
+            self._spool.flush()
+
+        state = {'identity': self.identity, 'done': list(self.done), 'spooled': self.spooled}
+        self._after_output(lambda: self._dump(state))
+        self._unsaved = 0
+
+    def _dump(self, state):
+        with open(self.path + STATE_SUFFIX + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(self.path + STATE_SUFFIX + '.tmp', self.path + STATE_SUFFIX)
+
+    def _remove(self):
+        for suffix in (STATE_SUFFIX, SPOOL_SUFFIX):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def close(self):
+        if self._spool is not None:
+            self._spool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is not None:
+            try:
+                self.save()
+            finally:
+                self.close()
+            return
+
+        self.close()
+        # NOTE State saved behind the output has to be removed after it's saved, not before.
+        self._after_output(self._remove)
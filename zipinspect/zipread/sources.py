@@ -0,0 +1,89 @@
+import time
+
+# Weight of a new sample in the moving averages of latency and throughput.
+EWMA_WEIGHT = 0.3
+# Guesses for sources not measured yet; optimistic, so that each gets tried.
+DEFAULT_LATENCY = 0.05
+DEFAULT_THROUGHPUT = 8 * 1024 * 1024
+# A failed source is avoided for this long in seconds, doubling with each further failure.
+FAILURE_BACKOFF = 2.0
+MAX_BACKOFF = 60.0
+# A request without response for this many times the usual latency is raced by another.
+HEDGE_FACTOR = 3
+MIN_HEDGE_DELAY = 0.05
+# A response stalled for this many times the usual latency is abandoned for another source.
+STALL_FACTOR = 20
+MIN_STALL_TIMEOUT = 2.0
+
+
+def _ewma(average, sample):
+    return sample if average is None else average + EWMA_WEIGHT * (sample - average)
+
+
+class Source:
+    """A URL the archive is served from, with its measured performance."""
+
+    def __init__(self, url):
+        self.url = url
+        self.latency = None
+        self.throughput = None
+        # Bytes requested from it and not received yet.
+        self.inflight = 0
+        self.failures = 0
+        self.retry_at = 0.0
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.retry_at
+
+    def estimate(self, size):
+        """Estimated time to fetch `size' bytes, after whatever is in flight already."""
+        latency = self.latency if self.latency is not None else DEFAULT_LATENCY
+        throughput = self.throughput or DEFAULT_THROUGHPUT
+
+        return latency + (self.inflight + size) / throughput
+
+    def record_latency(self, seconds):
+        self.latency = _ewma(self.latency, seconds)
+
+    def record_transfer(self, size, seconds):
+        # NOTE Tiny transfers tell more about latency than throughput.
+        if size >= 64 * 1024 and seconds > 0:
+            self.throughput = _ewma(self.throughput, size / seconds)
+
+    def record_failure(self):
+        self.failures += 1
+        self.retry_at = time.monotonic() + min(FAILURE_BACKOFF * 2 ** (self.failures - 1), MAX_BACKOFF)
+
+
+class SourceScheduler:
+    """Chooses which of several equivalent sources each request goes to: the one expected
+    to deliver it first, given their measured latency, throughput and load."""
+
+    def __init__(self, urls):
+        self.sources = [Source(url) for url in urls]
+
+    def __len__(self):
+        return len(self.sources)
+
+    def __iter__(self):
+        return iter(self.sources)
+
+    def pick(self, size, exclude=()):
+        """The best source for a request of `size' bytes, or None if all are excluded."""
+        candidates = [source for source in self.sources if source not in exclude]
+        # Failed sources are only used again once nothing else is left.
+        candidates = [source for source in candidates if source.healthy] or candidates
+
+        return min(candidates, key=lambda source: source.estimate(size), default=None)
+
+    def add(self, url):
+        self.sources.append(Source(url))
+
+    @staticmethod
+    def hedge_delay(source):
+        return max(MIN_HEDGE_DELAY, HEDGE_FACTOR * (source.latency or DEFAULT_LATENCY))
+
+    @staticmethod
+    def stall_timeout(source):
+        return max(MIN_STALL_TIMEOUT, STALL_FACTOR * (source.latency or DEFAULT_LATENCY))
@@ -0,0 +1,108 @@
+import json
+import time
+
+from collections import deque
+from contextlib import contextmanager
+
+# How many of the last entries extracted are kept along with the counters.
+ENTRY_LOG_SIZE = 1000
+
+
+def _bucket(value):
+    """Lower bound of the power-of-two bucket of a value, for histograms."""
+    return 1 << (max(int(value), 1).bit_length() - 1)
+
+
+def _count(histogram, value):
+    bucket = _bucket(value)
+    histogram[bucket] = histogram.get(bucket, 0) + 1
+
+
+class TransferStats:
+    """Counters and timers of what a reader transfers, for tuning and catching regressions.
+
+    Phases are timed as the time spent in them summed over concurrent tasks, so that they
+    may well add up to more than the wall time. Requests, entries and coarse phases are
+    also passed on to `callbacks' as they are recorded, as `callback(event, fields)'."""
+
+    def __init__(self, callbacks=()):
+        self.callbacks = list(callbacks)
+        self.started = time.monotonic()
+        # Kind of request -> how many were made.
+        self.requests = {}
+        self.bytes_received = 0
+        # Entries extracted, and their compressed sizes altogether.
+        self.entry_count = 0
+        self.entry_bytes = 0
+        # Name of phase -> [times entered, seconds spent].
+        self.phases = {}
+        # Power-of-two buckets of request latency in milliseconds, and of entry throughput
+        # in bytes per second.
+        self.latency_histogram = {}
+        self.throughput_histogram = {}
+        # (path, compressed size, size, seconds) of the last entries extracted; the ones before
+        # are only counted in, so that a long-lived reader doesn't keep one for each entry.
+        self.entries = deque(maxlen=ENTRY_LOG_SIZE)
+
+    def _emit(self, event, **fields):
+        for callback in self.callbacks:
+            callback(event, fields)
+
+    def record_request(self, kind, url, latency):
+        self.requests[kind] = self.requests.get(kind, 0) + 1
+        _count(self.latency_histogram, latency * 1000)
+        self._emit('request', kind=kind, url=url, latency=latency)
+
+    def record_bytes(self, n):
+        self.bytes_received += n
+
+    def record_phase(self, name, seconds):
+        phase = self.phases.setdefault(name, [0, 0.0])
+        phase[0] += 1
+        phase[1] += seconds
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.record_phase(name, seconds)
+            self._emit('phase', name=name, seconds=seconds)
+
+    def record_entry(self, info, seconds):
+        self.entry_count += 1
+        self.entry_bytes += info.compressed_size
+        self.entries.append((info.path, info.compressed_size, info.file_size, seconds))
+        if seconds > 0:
+            _count(self.throughput_histogram, info.compressed_size / seconds)
+
+        self._emit('entry', path=info.path, compressed_size=info.compressed_size,
+                   file_size=info.file_size, seconds=seconds)
+
+    @property
+    def overfetch(self):
+        """Bytes received per byte of compressed data of the entries extracted."""
+        return self.bytes_received / self.entry_bytes if self.entry_bytes else None
+
+    def to_dict(self):
+        return {
+            'elapsed': time.monotonic() - self.started,
+            'requests': dict(self.requests),
+            'bytes_received': self.bytes_received,
+            'entry_count': self.entry_count,
+            'entry_bytes': self.entry_bytes,
+            'overfetch': self.overfetch,
+            'phases': {name: {'count': count, 'seconds': seconds}
+                       for name, (count, seconds) in self.phases.items()},
+            'latency_histogram_ms': dict(sorted(self.latency_histogram.items())),
+            'throughput_histogram': dict(sorted(self.throughput_histogram.items())),
+            'entries': [{'path': path, 'compressed_size': compressed_size,
+                         'file_size': file_size, 'seconds': seconds}
+                        for path, compressed_size, file_size, seconds in self.entries]
+        }
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
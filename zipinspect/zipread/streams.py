@@ -0,0 +1,90 @@
+class RangeReader:
+    """Buffered sequential reader over a stream of chunks starting at byte `pos' of a
+    remote resource. Reading past the end of the stream issues a request through
+    `fetch' for just the missing bytes, instead of failing."""
+
+    def __init__(self, chunks, pos=0, *, fetch=None):
+        self._chunks = chunks
+        self._fetch = fetch
+        self._buf = b''
+        self._off = 0
+        self._refetched = None
+        self._expected = 0
+        self.pos = pos
+
+    @property
+    def buffered(self):
+        return len(self._buf) - self._off
+
+    async def _close_chunks(self):
+        if self._chunks is not None and hasattr(self._chunks, 'aclose'):
+            await self._chunks.aclose()
+        self._chunks = None
+
+    def expect(self, end):
+        """Hint that the bytes up to `end' are going to be read, so that a tail request
+        covers them all at once."""
+        self._expected = max(self._expected, end)
+
+    async def _fill(self, need, until):
+        """Buffer at least `need' bytes; `until' bounds any tail request that has to be made."""
+        while self.buffered < need:
+            chunk = await anext(self._chunks, None) if self._chunks is not None else None
+
+            if chunk is None:
+                start = self.pos + self.buffered
+                await self._close_chunks()
+
+                # NOTE A stream that ends prematurely twice in a row is a dead end.
+                if self._fetch is None or until <= start or self._refetched == start:
+                    raise EOFError(f"Unexpected end of stream at {start}")
+
+                self._refetched = start
+                self._chunks = self._fetch(start, max(until, self._expected))
+                continue
+
+            if chunk:
+                # NOTE A chunk that's all there is to read is kept as it is, not copied.
+                self._buf = bytes(self._buf[self._off:]) + chunk if self.buffered else chunk
+                self._off = 0
+
+    async def read(self, n):
+        await self._fill(n, self.pos + n)
+
+        data = self._buf[self._off:self._off + n]
+        self._off += n
+        self.pos += n
+
+        return data
+
+    async def readline(self, limit=8192):
+        while (end := self._buf.find(b'\n', self._off)) == -1:
+            if self.buffered >= limit:
+                raise ValueError("Line too long")
+            await self._fill(self.buffered + 1, self.pos + limit)
+
+        return await self.read(end + 1 - self._off)
+
+    async def skip(self, n):
+        async for _ in self.chunks(n):
+            pass
+
+    async def chunks(self, n):
+        """Yield chunks as they arrive, up to a total of `n' bytes."""
+        while n > 0:
+            if not self.buffered:
+                await self._fill(1, self.pos + n)
+
+            if self._off == 0 and len(self._buf) <= n:
+                data = self._buf
+                self._buf = b''
+            else:
+                data = self._buf[self._off:self._off + n]
+                self._off += len(data)
+
+            n -= len(data)
+            self.pos += len(data)
+            yield data
+
+    async def aclose(self):
+        await self._close_chunks()